@@ -7,23 +7,26 @@ Aplicação principal FastAPI focada apenas no bot de conversação
 
 import os
 import asyncio
-from fastapi.websockets import WebSocketDisconnect
 import uvicorn
 from fastapi import FastAPI, HTTPException
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.requests import Request
 from typing import List, Optional
 import logging
 import uuid
 import json
 import time
-import httpx
-from datetime import datetime, timedelta
+from datetime import datetime
 from pydantic import BaseModel
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
+# Configurar logging (fila + thread de escrita; LOG_LEVEL / ENABLE_DETAILED_LOGS)
+from config import railway_config
+from core.log_buffer import LogRingBuffer, RingBufferHandler, parse_level
+from core.logging_pipeline import LoggingPipeline
+
+log_buffer = LogRingBuffer(**railway_config.get_log_buffer_settings())
+log_pipeline = LoggingPipeline(**railway_config.get_logging_settings())
+log_pipeline.start(detailed_loggers=(__name__, "core"), extra_handlers=(RingBufferHandler(log_buffer),))
 logger = logging.getLogger(__name__)
 
 # 🔐 MODELOS PARA SISTEMA DE AUTENTICAÇÃO
@@ -37,9 +40,9 @@ class LoginRequest(BaseModel):
 class SessionValidation(BaseModel):
     token: str
 
-# 🗃️ ARMAZENAMENTO DE AUTENTICAÇÃO (em memória para simplicidade)
-pending_auth_requests = {}  # {request_id: {email, timestamp, ip, reason, etc}}
-active_sessions = {}       # {token: {email, timestamp, request_id}}
+# 🗃️ ARMAZENAMENTO DE AUTENTICAÇÃO (backend plugável: memória ou SQLite)
+# Solicitações pendentes: {request_id: {email, timestamp, ip, reason, etc}}
+# Sessões ativas: {token: {email, timestamp, request_id}}
 auth_settings = {
     "session_timeout": 3600,  # 1 hora
     "request_timeout": 300,   # 5 minutos
@@ -48,7 +51,21 @@ auth_settings = {
 
 # Importar módulo core essencial
 from core.conversation import SuperConversationEngine
-from config import Config, CLAUDIA_CONFIG
+from core.waha import WahaClient, WahaRouter, waha_base_url
+from core.resilience import CircuitBreaker, SendRateLimiter
+from core.dispatch import WebhookDispatcher
+from core.dedup import WebhookDeduplicator
+from core.outbox import DEFERRED, DELIVERED, FAILED, DurableOutbox
+from core.context_store import ConversationContextStore
+from core.metrics import InFlightMiddleware, MetricsRegistry, timed
+from core.compression import CompressionMiddleware, available_encodings, choose_encoding, compress
+from core.admission import AdmissionController, AdmissionMiddleware, MemoryProbe, RouteClass
+from core.governor import ResourceGovernor
+from core.stats import SharedStats
+from core.sessions import create_session_backend
+from core.webhook import WebhookTooLarge, decode_webhook, read_body
+from core.live_stats import StatsBroadcaster
+from config import Config
 
 # Inicializar FastAPI
 app = FastAPI(
@@ -68,30 +85,145 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Configurar arquivos estáticos com cabeçalhos anti-cache
-from fastapi.staticfiles import StaticFiles
-from starlette.staticfiles import StaticFiles as StarletteStaticFiles
+# 📈 MÉTRICAS (formato Prometheus em /metrics)
+metrics = MetricsRegistry()
+webhook_stage_seconds = metrics.histogram(
+    "claudia_webhook_stage_seconds", "Duração de cada etapa do processamento de webhooks", ["stage"])
+STAGE_JSON_DECODE = webhook_stage_seconds.labels("json_decode")
+STAGE_WEBHOOK_TOTAL = webhook_stage_seconds.labels("webhook_total")
+STAGE_ENGINE = webhook_stage_seconds.labels("engine")
+STAGE_WAHA_SEND = webhook_stage_seconds.labels("waha_send")
+waha_attempt_seconds = metrics.histogram(
+    "claudia_waha_attempt_seconds", "Duração de cada tentativa de envio ao WAHA", ["route"])
+waha_requests_total = metrics.counter(
+    "claudia_waha_requests_total", "Tentativas de envio ao WAHA por rota e status", ["route", "status"])
+intents_total = metrics.counter(
+    "claudia_intents_total", "Mensagens processadas por intenção detectada", ["intent"])
+http_in_flight = metrics.gauge(
+    "claudia_http_requests_in_flight", "Requisições HTTP em andamento")
+dispatch_queue_depth = metrics.gauge(
+    "claudia_dispatch_queue_depth", "Mensagens aguardando workers")
+dispatch_busy_workers = metrics.gauge(
+    "claudia_dispatch_busy_workers", "Workers processando mensagens")
+
+app.add_middleware(InFlightMiddleware, gauge=http_in_flight)
+
+# 🗜️ Compressão (ENABLE_COMPRESSION): JSON/HTML por resposta, assets pré-comprimidos no startup
+compression_settings = railway_config.get_compression_settings()
+compression_encodings = available_encodings() if compression_settings["enabled"] else ()
+if compression_settings["enabled"]:
+    compression_bytes_total = metrics.counter(
+        "claudia_http_compression_bytes_total", "Bytes de respostas antes e depois da compressão",
+        ["encoding", "stage"])
+    app.add_middleware(CompressionMiddleware,
+                       minimum_size=compression_settings["minimum_size"],
+                       gzip_level=compression_settings["gzip_level"],
+                       brotli_quality=compression_settings["brotli_quality"],
+                       bytes_counter=compression_bytes_total)
+
+# 🚦 Controle de admissão (get_cost_control_settings): adicionado por último, roda
+# antes de tudo; /webhook tem prioridade e o teto inteiro, dashboard e auth uma fração
+admission_settings = railway_config.get_admission_settings()
+
+def route_class_for(path: str) -> str:
+    if path == "/webhook":
+        return "webhook"
+    if path.startswith("/api/auth/"):
+        return "auth"
+    if path.endswith("/stream"):
+        return "stream"
+    # /api/stats também: é por onde se vê a governança de memória agindo
+    if path in ("/health", "/metrics", "/api/stats") or path.startswith("/static/"):
+        return "exempt"
+    return "dashboard"
+
+def build_route_classes(settings) -> List[RouteClass]:
+    share = settings["class_max_in_flight"]
+    deadline = settings["request_timeout"]
+    queue_timeout = settings["queue_timeout"]
+    return [
+        RouteClass("webhook", 0, settings["max_in_flight"], settings["webhook_max_body"], deadline,
+                   queue_timeout, sheddable=False),
+        RouteClass("auth", 1, share, settings["max_body"], deadline, queue_timeout),
+        RouteClass("dashboard", 2, share, settings["max_body"], deadline, queue_timeout),
+        # SSE: vida curta própria (SSE_MAX_SECONDS), fora do teto e sem prazo
+        RouteClass("stream", 3, None, settings["max_body"], None),
+        RouteClass("exempt", 0, None, settings["max_body"], deadline, sheddable=False),
+    ]
+
+# 🧠 Governança de memória: o mesmo RSS decide o descarte na admissão e o tamanho dos caches
+governor_settings = railway_config.get_governor_settings()
+resource_governor = ResourceGovernor(
+    MemoryProbe(governor_settings["memory_limit"]),
+    max_usage=governor_settings["max_usage"],
+    critical_usage=governor_settings["critical_usage"],
+    interval=governor_settings["interval"],
+    gc_threshold=governor_settings["gc_threshold"]
+)
+
+admission = AdmissionController(
+    build_route_classes(admission_settings),
+    route_class_for,
+    max_in_flight=admission_settings["max_in_flight"],
+    limiting=admission_settings["limiting"],
+    memory=resource_governor,
+    memory_shed_at=admission_settings["memory_shed_at"],
+    memory_critical_at=admission_settings["memory_critical_at"]
+)
+app.add_middleware(AdmissionMiddleware, controller=admission)
+
+# Arquivos estáticos com hash do conteúdo na URL (cache imutável; sw.js fica de fora)
 from starlette.responses import Response
-from starlette.types import Scope, Receive, Send
-
-class NoCacheStaticFiles(StarletteStaticFiles):
-    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
-        async def no_cache_send(message):
-            if message["type"] == "http.response.start":
-                headers = message.get("headers", [])
-                headers.append((b"Cache-Control", b"no-cache, no-store, must-revalidate"))
-                headers.append((b"Pragma", b"no-cache"))
-                headers.append((b"Expires", b"0"))
-                message["headers"] = headers
-            await send(message)
-        
-        await super().__call__(scope, receive, no_cache_send)
+from core.static_assets import AssetManifest, FingerprintedStaticFiles, content_etag, etag_matches
 
-app.mount("/static", NoCacheStaticFiles(directory="web/static"), name="static")
+static_assets = AssetManifest("web/static", encodings=compression_encodings,
+                              min_size=compression_settings["minimum_size"])
+app.mount("/static", FingerprintedStaticFiles(directory="web/static", manifest=static_assets), name="static")
 
 # Instâncias globais
 config = Config()
-conversation_engine = SuperConversationEngine()
+response_cache_settings = railway_config.get_response_cache_settings()
+conversation_engine = SuperConversationEngine(
+    cache_size=response_cache_settings["max_size"],
+    cache_ttl=response_cache_settings["ttl"]
+)
+waha_settings = railway_config.get_waha_http_settings()
+waha_client = WahaClient(waha_settings)
+waha_router = WahaRouter(demote_after=waha_settings["route_demote_after"],
+                         demote_ttl=waha_settings["route_demote_ttl"])
+protection_settings = railway_config.get_waha_protection_settings()
+waha_limiter = SendRateLimiter(
+    session_rate=protection_settings["session_rate"],
+    session_burst=protection_settings["session_burst"],
+    recipient_rate=protection_settings["recipient_rate"],
+    recipient_burst=protection_settings["recipient_burst"],
+    max_wait=protection_settings["max_wait"]
+)
+waha_breaker = CircuitBreaker(
+    failure_threshold=protection_settings["breaker_failure_threshold"],
+    reset_timeout=protection_settings["breaker_reset_timeout"]
+)
+dispatch_settings = railway_config.get_dispatch_settings()
+webhook_dedup = WebhookDeduplicator(max_entries=dispatch_settings["dedup_max_entries"],
+                                    ttl=dispatch_settings["dedup_ttl"])
+
+context_settings = railway_config.get_context_settings()
+context_store = ConversationContextStore(
+    max_chats=context_settings["max_chats"],
+    max_bytes=context_settings["max_bytes"],
+    idle_ttl=context_settings["idle_ttl"],
+    snapshot_path=context_settings["snapshot_path"]
+)
+if context_settings["web_workers"] > 1:
+    logger.info("🗃️ %d workers (WEB_CONCURRENCY): snapshot de contextos desligado",
+                context_settings["web_workers"])
+
+# Caches que a governança pode encolher sob pressão de memória
+resource_governor.register_cache("contexts", context_store.resize, context_settings["max_chats"])
+resource_governor.register_cache("dedup", webhook_dedup.resize, dispatch_settings["dedup_max_entries"])
+if conversation_engine.cache:
+    resource_governor.register_cache("response_cache", conversation_engine.cache.resize,
+                                     response_cache_settings["max_size"])
 
 # Estado do sistema
 system_state = {
@@ -102,6 +234,100 @@ system_state = {
     }
 }
 
+# Sessões e solicitações de login (compartilháveis entre workers)
+session_settings = railway_config.get_session_settings()
+session_store = create_session_backend(session_settings["backend"], session_settings["path"])
+
+# Contadores somados entre todos os workers uvicorn
+stats_settings = railway_config.get_stats_settings()
+shared_stats = SharedStats(
+    stats_settings["path"],
+    system_state["stats"],
+    interval=stats_settings["interval"],
+    retention=stats_settings["retention"]
+)
+
+# Vida máxima de um stream SSE: o uvicorn espera streams abertos antes do
+# shutdown, e o EventSource reconecta sozinho
+SSE_MAX_SECONDS = 20
+
+async def save_context_snapshot():
+    """Gravar snapshot dos contextos fora do event loop"""
+    records = context_store.snapshot_records()
+    await asyncio.get_running_loop().run_in_executor(None, context_store.write_snapshot, records)
+
+async def context_snapshot_loop():
+    """Snapshot periódico dos contextos de conversa"""
+    while True:
+        await asyncio.sleep(context_settings["snapshot_interval"])
+        try:
+            await save_context_snapshot()
+        except Exception as e:
+            logger.error(f"❌ Erro ao gravar snapshot de contextos: {e}")
+
+async def session_call(func, *args):
+    """Chamar o backend de autenticação (SQLite roda fora do event loop)"""
+    if session_store.blocking:
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+    return func(*args)
+
+async def purge_expired_sessions():
+    """Remover solicitações e sessões vencidas"""
+    return await session_call(session_store.purge_expired)
+
+async def session_sweeper_loop():
+    """Varredura periódica dos vencimentos de autenticação"""
+    while True:
+        await asyncio.sleep(session_settings["sweep_interval"])
+        try:
+            removed = await purge_expired_sessions()
+            if removed:
+                logger.info(f"🔐 {removed} solicitações/sessões vencidas removidas")
+        except Exception as e:
+            logger.error(f"❌ Erro na limpeza de sessões: {e}")
+
+@app.on_event("startup")
+async def startup_event():
+    """Inicializar recursos compartilhados"""
+    log_pipeline.capture_uvicorn()
+    app.state.session_sweeper = asyncio.create_task(session_sweeper_loop())
+    if context_store.snapshot_path:
+        context_store.load_snapshot()
+        app.state.context_snapshot = asyncio.create_task(context_snapshot_loop())
+    await shared_stats.start()
+    await waha_client.start()
+    await outbox.start()
+    await webhook_dispatcher.start()
+    await stats_broadcaster.start()
+    await resource_governor.start()
+    
+    # Descobrir o formato de envio do WAHA antes da primeira mensagem
+    waha_url = os.getenv("WAHA_URL")
+    if waha_url:
+        app.state.waha_probe = asyncio.create_task(waha_router.probe(waha_client, waha_base_url(waha_url)))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Liberar recursos compartilhados"""
+    # Sonda ainda rodando usaria o cliente WAHA depois do close()
+    waha_probe = getattr(app.state, "waha_probe", None)
+    if waha_probe is not None:
+        waha_probe.cancel()
+        await asyncio.gather(waha_probe, return_exceptions=True)
+    await stats_broadcaster.stop()
+    await resource_governor.stop()
+    await webhook_dispatcher.stop(dispatch_settings["drain_timeout"])
+    await outbox.stop()
+    await waha_client.close()
+    await shared_stats.stop()
+    app.state.session_sweeper.cancel()
+    session_store.close()
+    if context_store.snapshot_path:
+        app.state.context_snapshot.cancel()
+        await save_context_snapshot()
+    log_buffer.close()
+    log_pipeline.stop()
+
 @app.get("/health")
 async def health_check():
     """Healthcheck para Railway"""
@@ -116,143 +342,192 @@ async def health_check():
 # 🔗 WEBHOOK PARA INTEGRAÇÃO COM WAHA
 @app.post("/webhook")
 async def waha_webhook(request: Request):
-    """Webhook para receber mensagens do WAHA"""
+    """Webhook para receber mensagens do WAHA - enfileira e responde na hora"""
+    started = time.perf_counter()
     try:
-        data = await request.json()
-        logger.info(f"📱 Webhook recebido: {data}")
+        try:
+            body = await read_body(request, railway_config.MAX_REQUEST_SIZE)
+        except WebhookTooLarge as e:
+            logger.warning(f"⚠️ Webhook recusado por tamanho: {e}")
+            return JSONResponse(status_code=413, content={"success": False, "error": "Payload muito grande"})
         
-        # Processar mensagem do WhatsApp
-        if data.get("event") == "message":
-            message_data = data.get("payload", {})
-            phone = message_data.get("from")
-            message = message_data.get("body", "")
-            
-            if not message or not phone:
-                return {"success": False, "error": "Dados inválidos"}
-            
-            logger.info(f"💬 Mensagem do WhatsApp: {phone} -> {message}")
-            
-            # Processar com engine de conversação
-            result = conversation_engine.process_message(message, {})
-            response = result.get("response", "Desculpe, não entendi.")
-            
-            # Atualizar estatísticas
-            system_state["stats"]["messages_processed"] += 1
-            
-            # Enviar resposta de volta para WAHA
-            await send_waha_response(phone, response)
-            
-            logger.info(f"✅ Resposta enviada para {phone}: {response}")
-            
-        elif data.get("event") == "engine.event" and data.get("payload", {}).get("event") == "unread_count":
-            # Processar evento de mensagem não lida
-            payload = data.get("payload", {}).get("data", {})
-            last_message = payload.get("lastMessage", {})
-            phone = last_message.get("from")
-            message = last_message.get("body", "")
-            
-            if not message or not phone:
-                return {"success": False, "error": "Dados inválidos"}
-            
-            logger.info(f"💬 Mensagem do WhatsApp: {phone} -> {message}")
-            
-            # Processar com engine de conversação
-            result = conversation_engine.process_message(message, {})
-            response = result.get("response", "Desculpe, não entendi.")
-            
-            # Atualizar estatísticas
-            system_state["stats"]["messages_processed"] += 1
-            
-            # Enviar resposta de volta para WAHA
-            await send_waha_response(phone, response)
-            
-            logger.info(f"✅ Resposta enviada para {phone}: {response}")
-            
-        return {"success": True}
+        with timed(STAGE_JSON_DECODE):
+            event = decode_webhook(body)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("📱 Webhook recebido (%s, %d bytes): %r", event.event, len(body), body[:2000])
+        
+        # Só `message` e `engine.event`/unread_count trazem mensagem de cliente
+        incoming = event.message
+        if incoming is None:
+            return {"success": True}
+        
+        phone = incoming.chat_id
+        message = incoming.body
+        
+        if not message or not phone:
+            return {"success": False, "error": "Dados inválidos"}
+        
+        # Mesma mensagem chega por `message`, `engine.event` e reentregas
+        dedup_key = incoming.dedup_key
+        if not webhook_dedup.mark(dedup_key):
+            logger.debug("🔁 Mensagem duplicada ignorada: %s", dedup_key, extra={"chat": phone})
+            return {"success": True, "duplicate": True}
+        
+        logger.debug("💬 Mensagem do WhatsApp: %s -> %s", phone, message, extra={"chat": phone})
+        
+        # Enfileirar para os workers (engine + envio ao WAHA); a mesma
+        # conversa é processada em ordem, conversas diferentes em paralelo
+        if not webhook_dispatcher.submit(phone, phone, message):
+            webhook_dedup.forget(dedup_key)
+            logger.warning("⚠️ Fila de mensagens cheia, recusando webhook de %s", phone, extra={"chat": phone})
+            return JSONResponse(
+                status_code=503,
+                content={"success": False, "error": "Fila cheia, tente novamente"},
+                headers={"Retry-After": "5"}
+            )
+        
+        return {"success": True, "queued": True}
             
     except Exception as e:
-        logger.error(f"❌ Erro no webhook: {e}")
+        logger.error("❌ Erro no webhook: %s", e)
         return {"success": False, "error": str(e)}
+    finally:
+        STAGE_WEBHOOK_TOTAL.observe(time.perf_counter() - started)
 
-async def send_waha_response(phone: str, message: str):
-    """Enviar resposta para WAHA - Usando método que funciona"""
+async def handle_incoming_message(phone: str, message: str):
+    """Processar mensagem recebida e responder via WAHA (executado pelos workers)"""
+    # Contexto da conversa (nova conversa conta para as estatísticas)
+    context, created = context_store.touch(phone)
+    if created:
+        system_state["stats"]["conversations"] += 1
+    
+    # Processar com engine de conversação
+    with timed(STAGE_ENGINE):
+        result = conversation_engine.process_message(message, context.to_dict())
+    response = result.get("response", "Desculpe, não entendi.")
+    intents_total.labels(result.get("intent", "erro")).inc()
+    context_store.record_turn(phone, result.get("intent", "erro"), result.get("actions", []))
+    
+    # Atualizar estatísticas
+    system_state["stats"]["messages_processed"] += 1
+    
+    # Chat com respostas ainda na fila durável: esta vai atrás delas, para
+    # o cliente não receber a conversa fora de ordem
+    if outbox.has_pending(phone):
+        outbox.enqueue(phone, response, delay=0)
+        logger.debug("📮 Resposta para %s enfileirada atrás das pendentes", phone, extra={"chat": phone})
+        return
+    
+    # Enviar resposta de volta para WAHA; se não sair, fica na fila durável
+    with timed(STAGE_WAHA_SEND):
+        sent = await send_waha_response(phone, response)
+    if sent == DELIVERED:
+        logger.debug("✅ Resposta enviada para %s: %s", phone, response, extra={"chat": phone})
+    else:
+        outbox.enqueue(phone, response)
+
+async def send_waha_response(phone: str, message: str) -> str:
+    """Enviar resposta para WAHA - formato aprendido primeiro, demais como fallback
+
+    Devolve DELIVERED, FAILED (o WAHA falhou) ou DEFERRED (não tentado:
+    sem WAHA_URL, limitador de taxa ou circuito aberto), para a fila
+    durável só contar como tentativa o que chegou ao WAHA.
+    """
     waha_url = os.getenv("WAHA_URL")
     
     if not waha_url:
         logger.error("❌ WAHA_URL não configurado")
-        return
+        return DEFERRED
+    
+    host = waha_base_url(waha_url)
     
+    # WAHA fora do ar: falhar na hora em vez de pagar a cascata inteira
+    # (antes do limitador, para não gastar tokens em envio que não sai)
+    if not waha_breaker.allow():
+        logger.warning("⚡ Circuito WAHA aberto, envio para %s não tentado", phone, extra={"chat": phone})
+        return DEFERRED
+    
+    # Limite de envio por sessão (host, sessão "default") e por destinatário
+    if not await waha_limiter.acquire(host, phone):
+        waha_breaker.release()
+        logger.warning("🚦 Envio para %s recusado pelo limitador de taxa", phone, extra={"chat": phone})
+        return DEFERRED
+    
+    success = False
     try:
         # Tentar diferentes endpoints e formatos para contornar bug do WAHA
-        attempts = [
-            # Tentativa 1: Endpoint padrão com chatId
-            {
-                "endpoint": f"https://{waha_url}/api/sessions/default/messages/text",
-                "payload": {"chatId": phone, "text": message}
-            },
-            # Tentativa 2: Endpoint alternativo com to
-            {
-                "endpoint": f"https://{waha_url}/api/sendText",
-                "payload": {"session": "default", "to": phone, "text": message}
-            },
-            # Tentativa 3: Formato Baileys
-            {
-                "endpoint": f"https://{waha_url}/api/sessions/default/send/text",
-                "payload": {"chatId": phone, "text": message}
-            },
-            # Tentativa 4: Sem session no payload
-            {
-                "endpoint": f"https://{waha_url}/api/sendText",
-                "payload": {"to": phone, "text": message}
-            },
-            # Tentativa 5: Formato simplificado
-            {
-                "endpoint": f"https://{waha_url}/api/messages/text",
-                "payload": {"chatId": phone, "text": message}
-            }
-        ]
-        
-        success = False
-        for i, attempt in enumerate(attempts, 1):
+        for i, route in enumerate(waha_router.order(host), 1):
+            endpoint = host + route.path
+            payload = route.build_payload(phone, message)
+            attempt_started = time.perf_counter()
             try:
-                logger.info(f"🔄 Tentativa {i}: {attempt['endpoint']}")
-                logger.info(f"📤 Payload: {attempt['payload']}")
+                logger.debug("🔄 Tentativa %d (%s): %s", i, route.name, endpoint, extra={"chat": phone})
+                logger.debug("📤 Payload: %s", payload, extra={"chat": phone})
                 
-                async with httpx.AsyncClient(timeout=30.0) as client:
-                    response = await client.post(
-                        attempt['endpoint'], 
-                        json=attempt['payload'],
-                        headers={"Content-Type": "application/json"}
-                    )
+                response = await waha_client.post(endpoint, payload)
+                waha_attempt_seconds.labels(route.name).observe(time.perf_counter() - attempt_started)
+                waha_requests_total.labels(route.name, response.status_code).inc()
                     
-                if response.status_code == 200:
-                    logger.info(f"✅ Resposta enviada com sucesso via tentativa {i}")
+                if 200 <= response.status_code < 300:
+                    logger.debug("✅ Resposta enviada com sucesso via tentativa %d", i, extra={"chat": phone})
+                    waha_router.record_success(host, route, i)
                     success = True
                     break
                 else:
-                    logger.warning(f"⚠️ Tentativa {i} retornou: {response.status_code}")
+                    logger.warning("⚠️ Tentativa %d (%s) retornou: %d", i, route.name, response.status_code,
+                                   extra={"chat": phone})
                     if response.status_code != 404:
-                        logger.warning(f"⚠️ Resposta: {response.text[:200]}...")
+                        logger.warning("⚠️ Resposta: %s...", response.text[:200], extra={"chat": phone})
+                    waha_router.record_failure(host, route, response.status_code)
                     
             except Exception as e:
-                logger.warning(f"⚠️ Erro na tentativa {i}: {str(e)}")
+                logger.warning("⚠️ Erro na tentativa %d (%s): %s", i, route.name, e, extra={"chat": phone})
+                waha_attempt_seconds.labels(route.name).observe(time.perf_counter() - attempt_started)
+                waha_requests_total.labels(route.name, "error").inc()
+                waha_router.record_failure(host, route)
                 continue
         
         if not success:
-            logger.error(f"❌ Nenhuma tentativa funcionou para {phone}")
+            logger.error("❌ Nenhuma tentativa funcionou para %s", phone, extra={"chat": phone})
             # Log da resposta do bot para debug
-            logger.info(f"🤖 Resposta do bot (não enviada): {message}")
+            logger.debug("🤖 Resposta do bot (não enviada): %s", message, extra={"chat": phone})
         
     except Exception as e:
-        logger.error(f"❌ Erro geral ao enviar resposta para WAHA: {e}")
+        logger.error("❌ Erro geral ao enviar resposta para WAHA: %s", e, extra={"chat": phone})
+    
+    if success:
+        waha_breaker.record_success()
+    else:
+        waha_breaker.record_failure()
+    return DELIVERED if success else FAILED
 
-@app.get("/", response_class=HTMLResponse)
-async def dashboard(request: Request):
-    """Dashboard principal - carrega o sistema JavaScript completo"""
-    import time
-    # Adicionar timestamp para evitar cache do navegador
-    timestamp = int(time.time())
-    return HTMLResponse(content=f"""
+outbox_settings = railway_config.get_outbox_settings()
+outbox = DurableOutbox(
+    outbox_settings["path"],
+    send_waha_response,
+    max_attempts=outbox_settings["max_attempts"],
+    base_delay=outbox_settings["base_delay"],
+    max_delay=outbox_settings["max_delay"],
+    max_deferrals=outbox_settings["max_deferrals"],
+    lease=outbox_settings["lease"],
+    # Pior caso de um envio: todas as rotas estourando o timeout, mais a espera do limitador
+    send_timeout=len(waha_router.routes) * (waha_settings["connect_timeout"] + waha_settings["timeout"])
+                 + protection_settings["max_wait"],
+    # Sem WAHA_URL ou com o circuito aberto nem adianta retirar itens da fila
+    is_available=lambda: bool(os.getenv("WAHA_URL")) and not waha_breaker.is_open()
+)
+
+webhook_dispatcher = WebhookDispatcher(
+    handle_incoming_message,
+    workers=dispatch_settings["workers"],
+    max_queue=dispatch_settings["max_queue"]
+)
+dispatch_queue_depth.set_function(lambda: webhook_dispatcher.pending)
+dispatch_busy_workers.set_function(lambda: webhook_dispatcher.busy)
+
+def render_dashboard() -> str:
+    """HTML do dashboard principal (montado uma vez, no import)"""
+    return f"""
     <!DOCTYPE html>
         <html lang="pt-BR">
     <head>
@@ -261,7 +536,7 @@ async def dashboard(request: Request):
             <title>Claudia Cobranças - Bot de Conversação</title>
         <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/css/bootstrap.min.css" rel="stylesheet">
         <link href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css" rel="stylesheet">
-        <link href="/static/style.css?v={timestamp}" rel="stylesheet">
+        <link href="{static_assets.url('style.css')}" rel="stylesheet">
     </head>
     <body>
         <div id="loading" class="loading-overlay">
@@ -410,22 +685,54 @@ async def dashboard(request: Request):
         </div>
 
         <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/js/bootstrap.bundle.min.js"></script>
-        <script src="/static/app.js?v={timestamp}"></script>
+        <script src="{static_assets.url('app.js')}"></script>
     </body>
     </html>
-    """)
+    """
+
+DASHBOARD_HTML = render_dashboard().encode("utf-8")
+DASHBOARD_ETAG = content_etag(DASHBOARD_HTML)
+
+def compress_dashboard():
+    """Versões comprimidas do dashboard, geradas uma vez (qualidade máxima)"""
+    if len(DASHBOARD_HTML) < compression_settings["minimum_size"]:
+        return {}
+    variants = {}
+    for encoding in compression_encodings:
+        encoded = compress(DASHBOARD_HTML, encoding, gzip_level=9, brotli_quality=11)
+        if len(encoded) < len(DASHBOARD_HTML):
+            variants[encoding] = encoded
+    return variants
+
+DASHBOARD_VARIANTS = compress_dashboard()
+DASHBOARD_WEAK_ETAG = "W/" + DASHBOARD_ETAG  # mesmo conteúdo, outros bytes (como no CompressionMiddleware)
+
+@app.get("/", response_class=HTMLResponse)
+async def dashboard(request: Request):
+    """Dashboard principal - carrega o sistema JavaScript completo"""
+    encoding = choose_encoding(request.headers.get("accept-encoding"), DASHBOARD_VARIANTS)
+    # Sempre revalidar: o HTML aponta para os assets com hash, então muda a cada deploy
+    headers = {"ETag": DASHBOARD_ETAG if encoding is None else DASHBOARD_WEAK_ETAG, "Cache-Control": "no-cache"}
+    if DASHBOARD_VARIANTS:
+        headers["Vary"] = "Accept-Encoding"
+    if etag_matches(request.headers.get("if-none-match"), DASHBOARD_ETAG):
+        return Response(status_code=304, headers=headers)
+    if encoding is None:
+        return HTMLResponse(content=DASHBOARD_HTML, headers=headers)
+    # Já comprimido: o CompressionMiddleware deixa passar (tem Content-Encoding)
+    headers["Content-Encoding"] = encoding
+    return HTMLResponse(content=DASHBOARD_VARIANTS[encoding], headers=headers)
 
 # 🔐 SISTEMA DE AUTENTICAÇÃO
 @app.post("/api/auth/request")
 async def request_auth(request: LoginRequest, req: Request):
     """Solicitar autenticação - gera ID para aprovação manual"""
     try:
-        # Limpar requests antigos
+        # Limpar requests vencidos (só o topo do heap / faixa do índice)
         current_time = time.time()
-        pending_auth_requests = {k: v for k, v in pending_auth_requests.items() 
-                               if current_time - v["timestamp"] < auth_settings["request_timeout"]}
+        await purge_expired_sessions()
         
-        if len(pending_auth_requests) >= auth_settings["max_pending"]:
+        if await session_call(session_store.count_pending) >= auth_settings["max_pending"]:
             raise HTTPException(status_code=429, detail="Muitas solicitações pendentes")
         
         # Gerar ID único
@@ -436,29 +743,23 @@ async def request_auth(request: LoginRequest, req: Request):
         if "x-forwarded-for" in req.headers:
             client_ip = req.headers["x-forwarded-for"].split(",")[0].strip()
         
-        # Salvar request
-        pending_auth_requests[request_id] = {
+        # Salvar request (a senha não é guardada: o backend pode ir para disco)
+        await session_call(session_store.add_pending, request_id, {
             "email": request.email,
-            "password": request.password,
             "reason": request.reason,
             "ip": client_ip,
             "user_agent": request.user_agent or req.headers.get("user-agent", ""),
             "timestamp": current_time
-        }
+        }, current_time + auth_settings["request_timeout"])
         
-        # Log para aprovação manual
-        print(f"\n🔐 NOVA SOLICITAÇÃO DE LOGIN:")
-        print(f"   ID: {request_id}")
-        print(f"   Email: {request.email}")
-        print(f"   Motivo: {request.reason}")
-        print(f"   IP: {client_ip}")
-        print(f"   User-Agent: {request.user_agent or req.headers.get('user-agent', '')}")
-        print(f"   Timestamp: {datetime.fromtimestamp(current_time)}")
-        print(f"   Para aprovar, execute: python -c \"from app import approve_auth; approve_auth('{request_id}')\"")
-        print(f"   Para rejeitar, execute: python -c \"from app import reject_auth; reject_auth('{request_id}')\"")
-        print(f"   Ou acesse: http://localhost:8000/api/auth/approve/{request_id}")
-        print(f"   Ou acesse: http://localhost:8000/api/auth/reject/{request_id}")
-        print()
+        # Log para aprovação manual (WARNING: precisa aparecer mesmo no Railway)
+        user_agent = request.user_agent or req.headers.get("user-agent", "")
+        logger.warning(
+            "🔐 Nova solicitação de login %s de %s (motivo: %s, IP: %s, User-Agent: %s) - "
+            "aprovar: /api/auth/approve/%s | rejeitar: /api/auth/reject/%s",
+            request_id, request.email, request.reason, client_ip, user_agent, request_id, request_id,
+            extra={"event": "auth_request", "request_id": request_id, "email": request.email, "ip": client_ip}
+        )
         
         return {
             "success": True,
@@ -467,6 +768,8 @@ async def request_auth(request: LoginRequest, req: Request):
             "status": "pending"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Erro na solicitação de auth: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -475,12 +778,12 @@ async def request_auth(request: LoginRequest, req: Request):
 async def check_auth_status(request_id: str):
     """Verificar status da solicitação de autenticação"""
     try:
-        if request_id in pending_auth_requests:
+        if await session_call(session_store.get_pending, request_id) is not None:
             return {
                 "status": "pending",
                 "message": "Aguardando aprovação manual"
             }
-        elif request_id in active_sessions:
+        elif await session_call(session_store.get_session, request_id) is not None:
             return {
                 "status": "approved",
                 "message": "Acesso aprovado",
@@ -508,20 +811,21 @@ async def reject_auth_web(request_id: str):
 async def approve_auth(request_id: str):
     """Aprovar autenticação"""
     try:
-        if request_id not in pending_auth_requests:
-            raise HTTPException(status_code=404, detail="Solicitação não encontrada")
-        
-        # Mover para sessões ativas
-        request_data = pending_auth_requests.pop(request_id)
-        active_sessions[request_id] = {
-            "email": request_data["email"],
-            "timestamp": time.time(),
+        # Mover para sessões ativas (atômico no backend)
+        current_time = time.time()
+        request_data = await session_call(session_store.approve, request_id, {
+            "timestamp": current_time,
             "request_id": request_id
-        }
+        }, current_time + auth_settings["session_timeout"])
+        
+        if request_data is None:
+            raise HTTPException(status_code=404, detail="Solicitação não encontrada")
         
         logger.info(f"✅ Acesso aprovado para {request_data['email']}")
         return {"success": True, "message": "Acesso aprovado", "token": request_id}
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Erro ao aprovar auth: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -529,8 +833,8 @@ async def approve_auth(request_id: str):
 async def reject_auth(request_id: str):
     """Rejeitar autenticação"""
     try:
-        if request_id in pending_auth_requests:
-            request_data = pending_auth_requests.pop(request_id)
+        request_data = await session_call(session_store.pop_pending, request_id)
+        if request_data is not None:
             logger.info(f"❌ Acesso rejeitado para {request_data['email']}")
             return {"success": True, "message": "Acesso rejeitado"}
         else:
@@ -540,30 +844,123 @@ async def reject_auth(request_id: str):
         logger.error(f"Erro ao rejeitar auth: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-def validate_session(token: str) -> bool:
-    """Validar sessão ativa"""
-    if token not in active_sessions:
-        return False
-    
-    session = active_sessions[token]
-    if time.time() - session["timestamp"] > auth_settings["session_timeout"]:
-        del active_sessions[token]
-        return False
-    
-    return True
+async def validate_session(token: str) -> bool:
+    """Validar sessão ativa (sessões vencidas nunca são devolvidas pelo backend)"""
+    return await session_call(session_store.get_session, token) is not None
+
+@app.post("/api/auth/validate")
+async def validate_session_endpoint(request: SessionValidation):
+    """Validar token de sessão (usado pela tela de login)"""
+    return {"valid": await validate_session(request.token)}
 
 # 📊 API ENDPOINTS
-@app.get("/api/stats")
-async def get_stats():
-    """Obter estatísticas do sistema"""
+async def build_stats():
+    """Estatísticas do sistema (totais de todos os workers)"""
+    cluster = await shared_stats.get_totals()
     return {
         "success": True,
-        "stats": system_state["stats"],
+        "stats": cluster["totals"],
+        "worker": {
+            "id": cluster["worker_id"],
+            "stats": system_state["stats"],
+            "workers": cluster["workers"],
+            "live_workers": cluster["live_workers"]
+        },
+        "waha_http": waha_client.get_stats(),
+        "waha_routes": waha_router.get_stats(),
+        "waha_breaker": waha_breaker.get_stats(),
+        "waha_limiter": waha_limiter.get_stats(),
+        "dispatch": webhook_dispatcher.get_stats(),
+        "dedup": webhook_dedup.get_stats(),
+        "outbox": await outbox.get_stats(),
+        "contexts": context_store.get_stats(),
+        "auth": await session_call(session_store.get_stats),
+        "admission": admission.get_stats(),
+        "resources": resource_governor.get_stats(),
+        "logging": {**log_pipeline.get_stats(), "buffer": log_buffer.get_stats()},
+        "response_cache": conversation_engine.cache.get_stats() if conversation_engine.cache else None,
         "bot_active": system_state["bot_active"],
         "waha_url": os.getenv("WAHA_URL", "Não configurado"),
         "waha_instance": os.getenv("WAHA_INSTANCE_NAME", "Não configurado")
     }
 
+# 📡 Dashboards conectados recebem deltas de um único broadcaster
+stats_broadcaster = StatsBroadcaster(build_stats, interval=stats_settings["push_interval"])
+
+@app.get("/api/stats")
+async def get_stats():
+    """Obter estatísticas do sistema (totais de todos os workers)"""
+    return {**await build_stats(), "live_stats": stats_broadcaster.get_stats()}
+
+@app.get("/api/stats/stream")
+async def stream_stats():
+    """Estatísticas via Server-Sent Events: snapshot completo e depois só deltas"""
+    subscriber = await stats_broadcaster.subscribe()
+    snapshot = stats_broadcaster.snapshot_text
+
+    async def events():
+        deadline = asyncio.get_running_loop().time() + SSE_MAX_SECONDS
+        try:
+            yield f"retry: 1000\nid: {subscriber.version}\nevent: snapshot\ndata: {snapshot}\n\n"
+            while not stats_broadcaster.closed and not subscriber.closed:
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(subscriber.wakeup.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                if subscriber.closed:
+                    break
+                delta = subscriber.take()
+                if delta is not None:
+                    yield f"id: {subscriber.version}\nevent: delta\ndata: {delta}\n\n"
+        finally:
+            stats_broadcaster.unsubscribe(subscriber)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/api/outbox/dead-letters")
+async def list_dead_letters(limit: int = 50, offset: int = 0):
+    """Listar respostas que esgotaram as tentativas de envio"""
+    try:
+        return {
+            "success": True,
+            "dead_letters": await outbox.list_dead_letters(min(limit, 500), offset)
+        }
+    except Exception as e:
+        logger.error(f"Erro ao listar dead letters: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/outbox/dead-letters/replay")
+async def replay_all_dead_letters():
+    """Devolver todas as dead letters para a fila de saída"""
+    try:
+        replayed = await outbox.replay()
+        return {"success": True, "replayed": replayed}
+    except Exception as e:
+        logger.error(f"Erro ao reenviar dead letters: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/outbox/dead-letters/{dead_letter_id}/replay")
+async def replay_dead_letter(dead_letter_id: int):
+    """Devolver uma dead letter para a fila de saída"""
+    try:
+        replayed = await outbox.replay(dead_letter_id)
+    except Exception as e:
+        logger.error(f"Erro ao reenviar dead letter: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    if not replayed:
+        raise HTTPException(status_code=404, detail="Dead letter não encontrada")
+    return {"success": True, "replayed": replayed}
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Métricas no formato texto do Prometheus"""
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/api/conversation/test")
 async def test_conversation(request: Request):
     """Testar conversação"""
@@ -592,24 +989,62 @@ async def test_conversation(request: Request):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/logs")
-async def get_logs():
-    """Obter logs do sistema"""
+async def get_logs(cursor: Optional[int] = None, limit: int = 100, level: Optional[str] = None,
+                   chat: Optional[str] = None):
+    """Obter logs do sistema (mais novos primeiro; `cursor` pagina para trás)"""
     try:
-        # Logs básicos do sistema
-        logs = [
-            {"timestamp": datetime.now().isoformat(), "level": "INFO", "message": "Sistema iniciado"},
-            {"timestamp": datetime.now().isoformat(), "level": "INFO", "message": "Bot ativo"},
-            {"timestamp": datetime.now().isoformat(), "level": "INFO", "message": f"WAHA URL: {os.getenv('WAHA_URL', 'Não configurado')}"}
-        ]
-        
+        logs, next_cursor = log_buffer.page(before=cursor, limit=max(1, min(limit, 500)),
+                                            min_level=parse_level(level), chat=chat)
         return {
             "success": True,
-            "logs": logs
+            "logs": logs,
+            "next_cursor": next_cursor,
+            "latest_id": log_buffer.latest_id
         }
             
     except Exception as e:
         logger.error(f"Erro ao obter logs: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/logs/stream")
+async def stream_logs(request: Request, after: Optional[int] = None, level: Optional[str] = None,
+                      chat: Optional[str] = None):
+    """Tail dos logs via Server-Sent Events (retoma pelo Last-Event-ID)"""
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id and last_event_id.isdigit():
+        after = int(last_event_id)
+    if after is None:
+        after = log_buffer.latest_id
+    min_level = parse_level(level)
+
+    async def events():
+        nonlocal after
+        subscriber = log_buffer.subscribe()
+        loop, wakeup = subscriber
+        # Conexão com vida curta (SSE_MAX_SECONDS); retoma pelo Last-Event-ID
+        deadline = loop.time() + SSE_MAX_SECONDS
+        try:
+            yield "retry: 1000\n\n"
+            while not log_buffer.closed and loop.time() < deadline:
+                # Limpar antes de ler: registro que chegar durante o envio acorda de novo
+                wakeup.clear()
+                # `since` devolve no máximo uma página: esvaziar o atraso antes de dormir
+                while True:
+                    entries = log_buffer.since(after, min_level, chat)
+                    if not entries:
+                        break
+                    for entry in entries:
+                        after = entry["id"]
+                        yield f"id: {entry['id']}\ndata: {json.dumps(entry, ensure_ascii=False)}\n\n"
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout=max(0.0, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            log_buffer.unsubscribe(subscriber)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark do Engine - Claudia Cobranças
+Mede velocidade, alocações e precisão/recall por intenção do
+SuperConversationEngine sobre um corpus rotulado de mensagens de cobrança
+"""
+
+import argparse
+import gc
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+CORPUS_PATH = os.path.join(BENCH_DIR, "corpus.jsonl")
+BASELINES_PATH = os.path.join(BENCH_DIR, "baselines.json")
+sys.path.insert(0, ROOT_DIR)
+
+from core.conversation import IntentType, SuperConversationEngine
+
+def load_corpus(path: str = CORPUS_PATH) -> List[Dict[str, Any]]:
+    """Corpus JSONL: `intents[0]` é a intenção principal esperada, o resto
+    são intenções secundárias presentes na mesma mensagem"""
+    examples = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            example = json.loads(line)
+            for intent in example["intents"]:
+                IntentType(intent)  # rótulo inválido quebra aqui, com a linha no traceback
+            example.setdefault("tags", [])
+            example["line"] = line_number
+            examples.append(example)
+    return examples
+
+# ---- precisão / recall ----
+
+def _ratio(numerator: float, denominator: float) -> float:
+    return round(numerator / denominator, 4) if denominator else 0.0
+
+def evaluate(engine: SuperConversationEngine, examples: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Intenção principal (a que o engine responde) e conjunto de intenções detectadas"""
+    labels = [intent.value for intent in IntentType]
+    confusion = {expected: {predicted: 0 for predicted in labels} for expected in labels}
+    by_tag: Dict[str, List[int]] = {}
+    set_tp = set_fp = set_fn = 0
+    errors = []
+
+    for example in examples:
+        result = engine.process_message(example["text"])
+        expected = example["intents"][0]
+        predicted = result["intent"]
+        confusion[expected][predicted] += 1
+
+        detected = {match["intent"] for match in result.get("matches", [])} or {IntentType.DESCONHECIDO.value}
+        wanted = set(example["intents"])
+        set_tp += len(detected & wanted)
+        set_fp += len(detected - wanted)
+        set_fn += len(wanted - detected)
+
+        for tag in example["tags"] or ["sem_tag"]:
+            hits = by_tag.setdefault(tag, [0, 0])
+            hits[0] += predicted == expected
+            hits[1] += 1
+        if predicted != expected or detected != wanted:
+            errors.append({"line": example["line"], "text": example["text"], "expected": example["intents"],
+                           "predicted": predicted, "detected": sorted(detected)})
+
+    per_intent = {}
+    for label in labels:
+        tp = confusion[label][label]
+        support = sum(confusion[label].values())
+        predicted_total = sum(confusion[expected][label] for expected in labels)
+        precision = _ratio(tp, predicted_total)
+        recall = _ratio(tp, support)
+        f1 = _ratio(2 * precision * recall, precision + recall)
+        per_intent[label] = {"precision": precision, "recall": recall, "f1": f1, "support": support}
+
+    scored = [values for values in per_intent.values() if values["support"]]
+    correct = sum(confusion[label][label] for label in labels)
+    return {
+        "examples": len(examples),
+        "accuracy": _ratio(correct, len(examples)),
+        "macro_f1": _ratio(sum(values["f1"] for values in scored), len(scored)),
+        "per_intent": per_intent,
+        "multi_label": {"precision": _ratio(set_tp, set_tp + set_fp), "recall": _ratio(set_tp, set_tp + set_fn)},
+        "by_tag": {tag: _ratio(hits, total) for tag, (hits, total) in sorted(by_tag.items())},
+        "confusion": confusion,
+        "errors": errors,
+    }
+
+# ---- velocidade / alocações ----
+
+def _best_rate(run: Callable[[], None], count: int, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        gc.collect()
+        started = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - started)
+    return round(count / best, 1)
+
+def measure_speed(messages: List[str], repeats: int) -> Dict[str, float]:
+    """Mensagens/s (melhor de `repeats`): individual, em lote e com cache quente"""
+    plain = SuperConversationEngine()
+    cached = SuperConversationEngine(cache_size=len(set(messages)) + 1)
+    items: List[Tuple[str, None]] = [(message, None) for message in messages]
+
+    def single():
+        for message in messages:
+            plain.process_message(message)
+
+    def batch():
+        for _ in plain.process_messages(items):
+            pass
+
+    def warm_cache():
+        for message in messages:
+            cached.process_message(message)
+
+    warm_cache()
+    return {
+        "msgs_per_sec_single": _best_rate(single, len(messages), repeats),
+        "msgs_per_sec_batch": _best_rate(batch, len(messages), repeats),
+        "msgs_per_sec_cached": _best_rate(warm_cache, len(messages), repeats),
+    }
+
+def measure_allocations(messages: List[str]) -> Dict[str, float]:
+    """Blocos/bytes alocados por mensagem (tracemalloc)
+
+    Os resultados ficam vivos até a medição, então a diferença entre os
+    snapshots é tudo o que o engine produz por mensagem. Numa segunda
+    passada os resultados são descartados e o pico mede os temporários
+    (normalização, regex) de uma chamada.
+    """
+    engine = SuperConversationEngine()
+    engine.process_message(messages[0])  # aquecer caches internos do re/unicodedata
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        results = [engine.process_message(message) for message in messages]
+        after = tracemalloc.take_snapshot()
+        del results
+        gc.collect()
+        start_current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        for message in messages:
+            engine.process_message(message)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    diff = after.compare_to(before, "filename")
+    blocks = sum(stat.count_diff for stat in diff)
+    size = sum(stat.size_diff for stat in diff)
+    return {
+        "alloc_blocks_per_msg": round(blocks / len(messages), 2),
+        "alloc_bytes_per_msg": round(size / len(messages), 1),
+        "peak_transient_bytes": peak - start_current,
+    }
+
+# ---- baselines ----
+
+# (chave, maior é melhor?, tolerância absoluta ou None para usar a relativa)
+CHECKS = (
+    ("msgs_per_sec_single", True, None),
+    ("msgs_per_sec_batch", True, None),
+    ("alloc_blocks_per_msg", False, None),
+    ("accuracy", True, 0.001),     # corretude não pode piorar
+    ("macro_f1", True, 0.001),
+)
+
+def check_regressions(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    problems = []
+    for key, higher_is_better, absolute in CHECKS:
+        if key not in baseline:
+            continue
+        expected, actual = baseline[key], report[key]
+        slack = absolute if absolute is not None else abs(expected) * tolerance
+        if higher_is_better and actual < expected - slack:
+            problems.append(f"{key}: {actual} < {expected}")
+        elif not higher_is_better and actual > expected + slack:
+            problems.append(f"{key}: {actual} > {expected}")
+    return problems
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de velocidade e precisão do engine")
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    parser.add_argument("--messages", type=int, default=20000, help="mensagens por rodada de velocidade")
+    parser.add_argument("--repeats", type=int, default=5, help="rodadas (vale a melhor)")
+    parser.add_argument("--check", action="store_true", help="falhar (exit 1) se regredir sobre a baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="folga relativa de velocidade/alocação")
+    parser.add_argument("--update-baselines", action="store_true", help="gravar os resultados como baseline")
+    parser.add_argument("--errors", action="store_true", help="listar as mensagens classificadas errado")
+    parser.add_argument("--json", action="store_true", help="imprimir o relatório em JSON")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    examples = load_corpus(args.corpus)
+    texts = [example["text"] for example in examples]
+    messages = (texts * (args.messages // len(texts) + 1))[:args.messages]
+
+    quality = evaluate(SuperConversationEngine(), examples)
+    report = {**measure_speed(messages, args.repeats), **measure_allocations(messages),
+              **{key: quality[key] for key in ("examples", "accuracy", "macro_f1")}}
+
+    if args.json:
+        print(json.dumps({**report, "quality": quality}, indent=2, ensure_ascii=False))
+    else:
+        print(f"⚡ {report['msgs_per_sec_single']} msg/s individual, {report['msgs_per_sec_batch']} msg/s em lote, "
+              f"{report['msgs_per_sec_cached']} msg/s com cache")
+        print(f"🧮 {report['alloc_blocks_per_msg']} blocos / {report['alloc_bytes_per_msg']} bytes por mensagem "
+              f"(pico de temporários {report['peak_transient_bytes']} bytes)")
+        print(f"🎯 acurácia {quality['accuracy']:.1%}, macro-F1 {quality['macro_f1']:.3f} "
+              f"em {quality['examples']} exemplos; multi-intenção P {quality['multi_label']['precision']:.1%} "
+              f"R {quality['multi_label']['recall']:.1%}")
+        print(f"{'intenção':<24}{'precisão':>10}{'recall':>10}{'f1':>8}{'n':>5}")
+        for label, values in quality["per_intent"].items():
+            print(f"{label:<24}{values['precision']:>10.1%}{values['recall']:>10.1%}"
+                  f"{values['f1']:>8.3f}{values['support']:>5}")
+        print("🏷️ acurácia por tag: " + ", ".join(f"{tag} {value:.0%}" for tag, value in quality["by_tag"].items()))
+        if args.errors:
+            for error in quality["errors"]:
+                print(f"   ✗ linha {error['line']}: {error['text']!r} esperado {error['expected']} "
+                      f"→ {error['predicted']} {error['detected']}")
+
+    baselines = {}
+    if os.path.exists(BASELINES_PATH):
+        with open(BASELINES_PATH, encoding="utf-8") as f:
+            baselines = json.load(f)
+
+    failed = False
+    if args.check and "engine" in baselines:
+        problems = check_regressions(report, baselines["engine"], args.tolerance)
+        for problem in problems:
+            print(f"❌ engine: regressão em {problem}")
+        failed = bool(problems)
+
+    if args.update_baselines:
+        baselines["engine"] = {key: report[key] for key, _, _ in CHECKS}
+        with open(BASELINES_PATH, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"💾 Baseline do engine gravada em {BASELINES_PATH}")
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+WAHA Simulado - Claudia Cobranças
+Servidor local que imita os endpoints de envio do WAHA para testes de carga,
+com latência, taxa de erro e formatos aceitos configuráveis
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from typing import Dict, Iterable, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.waha import WAHA_ROUTES
+
+def _shape(route_name: str, payload: Dict) -> bool:
+    """O payload bate com o formato da rota? (duas rotas dividem /api/sendText)"""
+    if route_name == "send_text_session":
+        return "session" in payload and "to" in payload
+    if route_name == "send_text":
+        return "session" not in payload and "to" in payload
+    return "chatId" in payload
+
+def create_app(latency_ms: float = 20.0, jitter_ms: float = 5.0, error_rate: float = 0.0,
+               accept: Optional[Iterable[str]] = None, seed: Optional[int] = None) -> FastAPI:
+    """App FastAPI do WAHA simulado
+
+    `accept` lista os nomes de `WAHA_ROUTES` que esta "versão" do WAHA
+    entende; caminhos de outras rotas respondem 404 e payloads no formato
+    errado respondem 400, como um WAHA real de outra versão.
+    """
+    accepted = set(accept) if accept else {route.name for route in WAHA_ROUTES}
+    routes_by_path: Dict[str, list] = {}
+    for route in WAHA_ROUTES:
+        if route.name in accepted:
+            routes_by_path.setdefault(route.path, []).append(route.name)
+
+    rng = random.Random(seed)
+    stats = {"received": 0, "delivered": 0, "errors": 0, "rejected": 0, "probes": 0,
+             "by_route": {}, "started_at": time.time(), "last_delivery_at": None}
+    app = FastAPI(title="Fake WAHA")
+
+    @app.get("/__stats")
+    async def get_stats():
+        return stats
+
+    @app.post("/__reset")
+    async def reset():
+        stats.update(received=0, delivered=0, errors=0, rejected=0, probes=0,
+                     by_route={}, started_at=time.time(), last_delivery_at=None)
+        return {"success": True}
+
+    @app.post("/{path:path}")
+    async def send(path: str, request: Request):
+        names = routes_by_path.get("/" + path)
+        if not names:
+            return JSONResponse(status_code=404, content={"error": "Not Found"})
+
+        payload = await request.json()
+        if not payload:
+            # Sonda do WahaRouter: rota existe, payload inválido
+            stats["probes"] += 1
+            return JSONResponse(status_code=422, content={"error": "empty payload"})
+
+        stats["received"] += 1
+        route_name = next((name for name in names if _shape(name, payload)), None)
+        if route_name is None:
+            stats["rejected"] += 1
+            return JSONResponse(status_code=400, content={"error": "invalid payload"})
+
+        delay = max(0.0, latency_ms + rng.uniform(-jitter_ms, jitter_ms)) / 1000
+        if delay:
+            await asyncio.sleep(delay)
+        if rng.random() < error_rate:
+            stats["errors"] += 1
+            return JSONResponse(status_code=500, content={"error": "simulated failure"})
+
+        stats["delivered"] += 1
+        stats["by_route"][route_name] = stats["by_route"].get(route_name, 0) + 1
+        stats["last_delivery_at"] = time.time()
+        return {"id": f"true_{payload.get('chatId') or payload.get('to')}_{stats['delivered']}"}
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="WAHA simulado para testes de carga")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3001)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--jitter-ms", type=float, default=5.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--accept", default="",
+                        help="rotas aceitas, separadas por vírgula (padrão: todas) - "
+                             + ", ".join(route.name for route in WAHA_ROUTES))
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    accept = [name.strip() for name in args.accept.split(",") if name.strip()]
+    app = create_app(args.latency_ms, args.jitter_ms, args.error_rate, accept, args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning", access_log=False)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Teste de Carga - Claudia Cobranças
+Sobe o app e um WAHA simulado, dispara webhooks numa taxa controlada e
+compara vazão, latência e memória com as baselines gravadas
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+BASELINES_PATH = os.path.join(BENCH_DIR, "baselines.json")
+
+# Cenários: taxa de webhooks e comportamento do WAHA simulado
+SCENARIOS: Dict[str, Dict[str, Any]] = {
+    "steady": {
+        "rate": 200, "duration": 10, "chats": 500,
+        "latency_ms": 20, "error_rate": 0.0, "accept": ""
+    },
+    # WAHA antigo: só o último formato existe, o roteador precisa aprender
+    "legacy_waha": {
+        "rate": 200, "duration": 10, "chats": 500,
+        "latency_ms": 20, "error_rate": 0.0, "accept": "messages_text"
+    },
+    # WAHA instável: 5% de 500 alimentam outbox e circuit breaker
+    "flaky_waha": {
+        "rate": 100, "duration": 10, "chats": 300,
+        "latency_ms": 50, "error_rate": 0.05, "accept": ""
+    },
+}
+
+# Mensagens típicas de clientes em cobrança (mistura de intenções)
+SAMPLE_MESSAGES = [
+    "oi, bom dia",
+    "quero pagar minha fatura",
+    "qual o valor da minha dívida?",
+    "não consigo pagar agora",
+    "dá pra parcelar em 3 vezes?",
+    "me manda o boleto por favor",
+    "já paguei ontem",
+    "quero negociar",
+    "obrigado",
+    "quem é você?",
+    "Olá! Preciso de ajuda com o pagamento da conta de março",
+    "vocês aceitam pix?",
+]
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+def read_rss_mb(pid: int) -> float:
+    """RSS atual do processo em MB (Linux: /proc; senão `ps`)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        output = subprocess.check_output(["ps", "-o", "rss=", "-p", str(pid)], text=True)
+        return int(output.strip()) / 1024
+    except (OSError, ValueError, subprocess.CalledProcessError):
+        return 0.0
+
+def build_payload(rng: random.Random, seq: int, chats: int, previous: List[Dict]) -> Dict[str, Any]:
+    """Webhook realista: `message` na maioria, `engine.event` (às vezes reentrega)"""
+    if previous and rng.random() < 0.1:
+        # Mesma mensagem chegando pelo evento de não lidas (deve ser deduplicada)
+        message = rng.choice(previous)
+        return {"event": "engine.event", "session": "default",
+                "payload": {"event": "unread_count", "data": {"lastMessage": message}}}
+
+    message = {
+        "id": f"false_{seq}@c.us_BENCH{seq:010d}",
+        "timestamp": int(time.time()),
+        "from": f"5511{rng.randrange(chats):09d}@c.us",
+        "fromMe": False,
+        "body": rng.choice(SAMPLE_MESSAGES),
+        "hasMedia": False,
+    }
+    previous.append(message)
+    if len(previous) > 200:
+        del previous[:100]
+
+    if rng.random() < 0.2:
+        return {"event": "engine.event", "session": "default",
+                "payload": {"event": "unread_count", "data": {"lastMessage": message}}}
+    return {"event": "message", "session": "default", "payload": message}
+
+async def wait_ready(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Serviço não respondeu em {timeout}s: {url}")
+
+async def drive(app_url: str, rate: float, duration: float, chats: int, concurrency: int,
+                seed: int) -> Dict[str, Any]:
+    """Disparo em malha aberta: a requisição i sai em t0 + i/rate"""
+    rng = random.Random(seed)
+    previous: List[Dict] = []
+    total = int(rate * duration)
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    queued = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=app_url, limits=limits, timeout=30.0) as client:
+        async def fire(payload: Dict[str, Any]):
+            nonlocal queued
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await client.post("/webhook", json=payload)
+                    key = str(response.status_code)
+                    if response.status_code == 200 and response.json().get("queued"):
+                        queued += 1
+                except httpx.HTTPError as e:
+                    key = type(e).__name__
+                latencies.append(time.perf_counter() - started)
+                statuses[key] = statuses.get(key, 0) + 1
+
+        tasks = []
+        started_at = time.time()
+        t0 = time.perf_counter()
+        for seq in range(total):
+            delay = t0 + seq / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(fire(build_payload(rng, seq, chats, previous))))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - t0
+
+    return {"sent": total, "queued": queued, "started_at": started_at, "elapsed": elapsed,
+            "latencies": latencies, "statuses": statuses}
+
+async def run_scenario(name: str, overrides: Dict[str, Any], concurrency: int, seed: int,
+                       keep_logs: bool) -> Dict[str, Any]:
+    scenario = {**SCENARIOS[name], **{k: v for k, v in overrides.items() if v is not None}}
+    workdir = tempfile.mkdtemp(prefix=f"claudia-bench-{name}-")
+    waha_port, app_port = free_port(), free_port()
+    waha_url, app_url = f"http://127.0.0.1:{waha_port}", f"http://127.0.0.1:{app_port}"
+
+    waha_log = open(os.path.join(workdir, "fake_waha.log"), "w")
+    app_log = open(os.path.join(workdir, "app.log"), "w")
+    waha_proc = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, "fake_waha.py"), "--port", str(waha_port),
+         "--latency-ms", str(scenario["latency_ms"]), "--error-rate", str(scenario["error_rate"]),
+         "--accept", scenario["accept"], "--seed", str(seed)],
+        cwd=ROOT_DIR, stdout=waha_log, stderr=subprocess.STDOUT
+    )
+    env = {
+        **os.environ,
+        "WAHA_URL": waha_url,
+        "PORT": str(app_port),
+        # Estado em disco isolado por execução
+        "OUTBOX_PATH": os.path.join(workdir, "outbox.db"),
+        "STATS_DB_PATH": os.path.join(workdir, "stats.db"),
+        "SESSION_DB_PATH": os.path.join(workdir, "sessions.db"),
+        "CONTEXT_SNAPSHOT_PATH": "",
+        # Mede o servidor, não o limitador de envio (que tem defaults de produção)
+        "WAHA_SESSION_RATE": os.environ.get("WAHA_SESSION_RATE", "100000"),
+        "WAHA_SESSION_BURST": os.environ.get("WAHA_SESSION_BURST", "100000"),
+    }
+    app_proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(app_port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=ROOT_DIR, env=env, stdout=app_log, stderr=subprocess.STDOUT
+    )
+
+    rss_samples: List[float] = []
+    stop_sampling = asyncio.Event()
+
+    async def sample_rss():
+        while not stop_sampling.is_set():
+            rss_samples.append(read_rss_mb(app_proc.pid))
+            try:
+                await asyncio.wait_for(stop_sampling.wait(), 0.1)
+            except asyncio.TimeoutError:
+                pass
+
+    try:
+        await wait_ready(f"{waha_url}/__stats")
+        await wait_ready(f"{app_url}/health")
+        rss_idle = read_rss_mb(app_proc.pid)
+        sampler = asyncio.create_task(sample_rss())
+
+        result = await drive(app_url, scenario["rate"], scenario["duration"], scenario["chats"],
+                             concurrency, seed)
+
+        # Esperar a fila drenar: entregas no WAHA simulado param de crescer
+        drain_started = time.perf_counter()
+        async with httpx.AsyncClient() as client:
+            last, stable_since = -1, time.perf_counter()
+            while time.perf_counter() - drain_started < 60:
+                waha_stats = (await client.get(f"{waha_url}/__stats")).json()
+                handled = waha_stats["delivered"] + waha_stats["errors"]
+                if handled != last:
+                    last, stable_since = handled, time.perf_counter()
+                elif handled >= result["queued"] or time.perf_counter() - stable_since > 3:
+                    break
+                await asyncio.sleep(0.2)
+            app_stats = (await client.get(f"{app_url}/api/stats")).json()
+        stop_sampling.set()
+        await sampler
+    finally:
+        for proc in (app_proc, waha_proc):
+            proc.terminate()
+        for proc in (app_proc, waha_proc):
+            try:
+                proc.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        waha_log.close()
+        app_log.close()
+        if not keep_logs:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    latencies = result["latencies"]
+    delivery_window = (waha_stats["last_delivery_at"] or time.time()) - result["started_at"]
+    return {
+        "scenario": name,
+        "config": scenario,
+        "sent": result["sent"],
+        "queued": result["queued"],
+        "statuses": result["statuses"],
+        "throughput_rps": round(result["sent"] / result["elapsed"], 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "delivered": waha_stats["delivered"],
+        "delivered_rps": round(waha_stats["delivered"] / delivery_window, 1) if delivery_window > 0 else 0.0,
+        "waha_errors": waha_stats["errors"],
+        "waha_routes": waha_stats["by_route"],
+        "duplicates_suppressed": app_stats.get("dedup", {}).get("duplicates_suppressed"),
+        "outbox_pending": app_stats.get("outbox", {}).get("pending"),
+        "rss_idle_mb": round(rss_idle, 1),
+        "rss_peak_mb": round(max(rss_samples, default=rss_idle), 1),
+        "logs": workdir if keep_logs else None,
+    }
+
+# Métricas comparadas com a baseline: (chave, maior é melhor?)
+CHECKS = (("throughput_rps", True), ("delivered_rps", True), ("p95_ms", False),
+          ("p99_ms", False), ("rss_peak_mb", False))
+
+def check_regressions(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    problems = []
+    for key, higher_is_better in CHECKS:
+        if key not in baseline:
+            continue
+        expected, actual = baseline[key], report[key]
+        if higher_is_better and actual < expected * (1 - tolerance):
+            problems.append(f"{key}: {actual} < {expected} (-{tolerance:.0%})")
+        elif not higher_is_better and actual > expected * (1 + tolerance):
+            problems.append(f"{key}: {actual} > {expected} (+{tolerance:.0%})")
+    return problems
+
+def load_baselines() -> Dict[str, Any]:
+    if not os.path.exists(BASELINES_PATH):
+        return {}
+    with open(BASELINES_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Teste de carga do webhook com WAHA simulado")
+    parser.add_argument("scenarios", nargs="*", default=list(SCENARIOS),
+                        help="cenários a rodar: " + ", ".join(SCENARIOS))
+    parser.add_argument("--rate", type=float, help="webhooks por segundo (sobrescreve o cenário)")
+    parser.add_argument("--duration", type=float, help="segundos de disparo (sobrescreve o cenário)")
+    parser.add_argument("--chats", type=int, help="número de conversas distintas")
+    parser.add_argument("--concurrency", type=int, default=256, help="requisições simultâneas no máximo")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--check", action="store_true", help="falhar (exit 1) se regredir além da tolerância")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="folga relativa sobre a baseline")
+    parser.add_argument("--update-baselines", action="store_true", help="gravar os resultados como baseline")
+    parser.add_argument("--keep-logs", action="store_true", help="manter logs e bancos da execução")
+    parser.add_argument("--json", action="store_true", help="imprimir o relatório em JSON")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"cenário desconhecido: {', '.join(unknown)}")
+
+    overrides = {"rate": args.rate, "duration": args.duration, "chats": args.chats}
+    baselines = load_baselines()
+    reports, failed = [], False
+
+    for name in args.scenarios:
+        report = asyncio.run(run_scenario(name, overrides, args.concurrency, args.seed, args.keep_logs))
+        reports.append(report)
+        if not args.json:
+            print(f"📊 {name}: {report['throughput_rps']} req/s, entregues {report['delivered_rps']} msg/s, "
+                  f"p50 {report['p50_ms']} ms, p95 {report['p95_ms']} ms, p99 {report['p99_ms']} ms, "
+                  f"RSS {report['rss_idle_mb']} → {report['rss_peak_mb']} MB, status {report['statuses']}")
+        if args.check and name in baselines:
+            problems = check_regressions(report, baselines[name], args.tolerance)
+            for problem in problems:
+                print(f"❌ {name}: regressão em {problem}")
+            failed = failed or bool(problems)
+
+    if args.json:
+        print(json.dumps(reports, indent=2, ensure_ascii=False))
+
+    if args.update_baselines:
+        for report in reports:
+            baselines[report["scenario"]] = {key: report[key] for key, _ in CHECKS}
+        with open(BASELINES_PATH, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"💾 Baselines gravadas em {BASELINES_PATH}")
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
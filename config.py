@@ -58,6 +58,15 @@ class RailwayConfig:
             'compress_responses': True
         }
     
+    def get_compression_settings(self):
+        """Compressão gzip/brotli das respostas e dos assets estáticos"""
+        return {
+            'enabled': os.getenv('ENABLE_COMPRESSION', str(self.ENABLE_COMPRESSION)) == 'True',
+            'minimum_size': int(os.getenv('COMPRESSION_MIN_SIZE', 1024)),  # bytes
+            'gzip_level': int(os.getenv('COMPRESSION_GZIP_LEVEL', 6)),
+            'brotli_quality': int(os.getenv('COMPRESSION_BROTLI_QUALITY', 5))
+        }
+    
     def get_cost_control_settings(self):
         """Configurações para controle de custos"""
         return {
@@ -68,6 +77,149 @@ class RailwayConfig:
             'sleep_inactive_time': 300 if self.RAILWAY_DEPLOY else 0  # 5min sleep
         }
 
+    def get_admission_settings(self):
+        """Controle de admissão HTTP a partir do get_cost_control_settings()"""
+        cost = self.get_cost_control_settings()
+        memory_limit_mb = os.getenv('MEMORY_LIMIT_MB')
+        shed_at = self.get_railway_optimizations().get('max_memory_usage', 0.8)
+        max_in_flight = int(os.getenv('MAX_CONCURRENT_REQUESTS', cost['max_concurrent_requests']))
+        return {
+            'limiting': os.getenv('ENABLE_REQUEST_LIMITING', str(cost['enable_request_limiting'])) == 'True',
+            'max_in_flight': max_in_flight,
+            # Vagas de cada classe do dashboard/auth (o webhook usa o teto inteiro)
+            'class_max_in_flight': max(1, min(max_in_flight, int(os.getenv('CONCURRENT_REQUESTS',
+                                                                           self.CONCURRENT_REQUESTS)))),
+            'request_timeout': float(os.getenv('REQUEST_TIMEOUT', cost['request_timeout'])),
+            'max_body': int(os.getenv('MAX_BODY_SIZE', cost['max_file_size'])),
+            'webhook_max_body': self.MAX_REQUEST_SIZE,
+            'queue_timeout': float(os.getenv('ADMISSION_QUEUE_TIMEOUT', 2)),  # espera por vaga
+            'memory_limit': int(memory_limit_mb) * 1024 * 1024 if memory_limit_mb else None,  # None = cgroup
+            'memory_shed_at': float(os.getenv('MEMORY_SHED_AT', shed_at)),
+            'memory_critical_at': float(os.getenv('MEMORY_CRITICAL_AT', min(0.95, shed_at + 0.1)))
+        }
+
+    def get_governor_settings(self):
+        """Governança de memória (get_railway_optimizations): GC e caches"""
+        optimizations = self.get_railway_optimizations()
+        admission = self.get_admission_settings()
+        gc_threshold = os.getenv('GC_THRESHOLD')  # ex.: "700,10,10"
+        return {
+            'gc_threshold': tuple(int(value) for value in gc_threshold.split(',')) if gc_threshold
+                            else optimizations.get('gc_threshold'),
+            'memory_limit': admission['memory_limit'],
+            'max_usage': admission['memory_shed_at'],
+            'critical_usage': admission['memory_critical_at'],
+            'interval': float(os.getenv('GOVERNOR_INTERVAL', 5))
+        }
+
+    def get_waha_http_settings(self):
+        """Configurações do pool HTTP de envio ao WAHA"""
+        return {
+            'max_connections': int(os.getenv('WAHA_MAX_CONNECTIONS', 10 if self.RAILWAY_DEPLOY else 20)),
+            'max_keepalive_connections': int(os.getenv('WAHA_MAX_KEEPALIVE', 5 if self.RAILWAY_DEPLOY else 10)),
+            'keepalive_expiry': float(os.getenv('WAHA_KEEPALIVE_EXPIRY', 60)),
+            'timeout': int(os.getenv('WAHA_TIMEOUT', 30000)) / 1000,  # ms, como no .env
+            'connect_timeout': float(os.getenv('WAHA_CONNECT_TIMEOUT', 10)),
+            'http2': os.getenv('WAHA_HTTP2', 'False') == 'True',
+            'route_demote_after': int(os.getenv('WAHA_ROUTE_DEMOTE_AFTER', 2)),
+            'route_demote_ttl': float(os.getenv('WAHA_ROUTE_DEMOTE_TTL', 300))
+        }
+
+    def get_waha_protection_settings(self):
+        """Limites de envio e circuit breaker do WAHA"""
+        return {
+            'session_rate': float(os.getenv('WAHA_SESSION_RATE', 5)),          # msgs/s por sessão
+            'session_burst': float(os.getenv('WAHA_SESSION_BURST', 10)),
+            'recipient_rate': float(os.getenv('WAHA_RECIPIENT_RATE', 0.5)),    # msgs/s por destinatário
+            'recipient_burst': float(os.getenv('WAHA_RECIPIENT_BURST', 3)),
+            'max_wait': float(os.getenv('WAHA_RATE_MAX_WAIT', 2)),
+            'breaker_failure_threshold': int(os.getenv('WAHA_BREAKER_FAILURES', 5)),
+            'breaker_reset_timeout': float(os.getenv('WAHA_BREAKER_RESET', 30))
+        }
+
+    def get_outbox_settings(self):
+        """Fila de saída durável (respostas não entregues ao WAHA)"""
+        return {
+            'path': os.getenv('OUTBOX_PATH', 'temp/outbox.db'),
+            'max_attempts': int(os.getenv('OUTBOX_MAX_ATTEMPTS', 8)),
+            'base_delay': float(os.getenv('OUTBOX_BASE_DELAY', 5)),
+            'max_delay': float(os.getenv('OUTBOX_MAX_DELAY', 900)),
+            # Adiamentos locais (circuito aberto, limitador) antes de virar dead letter
+            'max_deferrals': int(os.getenv('OUTBOX_MAX_DEFERRALS', 50)),
+            'lease': float(os.getenv('OUTBOX_LEASE', 120))  # renovado durante o envio do lote
+        }
+
+    def get_context_settings(self):
+        """Memória de contexto por conversa"""
+        # Com vários processos uvicorn cada um tem só parte dos chats e todos
+        # gravariam o mesmo arquivo: snapshot apenas com um worker
+        web_workers = int(os.getenv('WEB_CONCURRENCY', 1))
+        snapshot_path = os.getenv('CONTEXT_SNAPSHOT_PATH', 'temp/contexts.json') or None
+        return {
+            'max_chats': int(os.getenv('CONTEXT_MAX_CHATS', 20000 if self.RAILWAY_DEPLOY else 50000)),
+            'max_bytes': int(os.getenv('CONTEXT_MAX_BYTES', (16 if self.RAILWAY_DEPLOY else 64) * 1024 * 1024)),
+            'idle_ttl': float(os.getenv('CONTEXT_IDLE_TTL', 21600)),  # 6 horas
+            'web_workers': web_workers,
+            'snapshot_path': snapshot_path if web_workers <= 1 else None,
+            'snapshot_interval': float(os.getenv('CONTEXT_SNAPSHOT_INTERVAL', 60))
+        }
+
+    def get_response_cache_settings(self):
+        """Cache de respostas do engine (frases repetidas)"""
+        default_size = 5000 if self.ENABLE_CACHING else 0
+        return {
+            'max_size': int(os.getenv('RESPONSE_CACHE_SIZE', default_size)),  # 0 desliga
+            'ttl': self.CACHE_TTL
+        }
+
+    def get_stats_settings(self):
+        """Agregação de estatísticas entre workers"""
+        return {
+            'path': os.getenv('STATS_DB_PATH', 'temp/stats.db'),
+            'interval': float(os.getenv('STATS_PUBLISH_INTERVAL', 1)),
+            'retention': float(os.getenv('STATS_RETENTION', 86400)),
+            'push_interval': float(os.getenv('STATS_PUSH_INTERVAL', 2))  # tick do dashboard ao vivo
+        }
+
+    def get_logging_settings(self):
+        """Pipeline de logs: nível, formato, trilha detalhada e amostragem"""
+        return {
+            'level': os.getenv('LOG_LEVEL', self.LOG_LEVEL),
+            'json_output': os.getenv('LOG_FORMAT', 'json' if self.RAILWAY_DEPLOY else 'text') == 'json',
+            'detailed': os.getenv('ENABLE_DETAILED_LOGS', str(self.ENABLE_DETAILED_LOGS)) == 'True',
+            'sample_rates': {
+                'DEBUG': float(os.getenv('LOG_SAMPLE_DEBUG', 1.0)),
+                'INFO': float(os.getenv('LOG_SAMPLE_INFO', 1.0)),
+                'WARNING': float(os.getenv('LOG_SAMPLE_WARNING', 1.0))
+            },
+            'queue_size': int(os.getenv('LOG_QUEUE_SIZE', 10000))
+        }
+
+    def get_log_buffer_settings(self):
+        """Últimos logs em memória para o /api/logs"""
+        return {
+            'max_entries': int(os.getenv('LOG_BUFFER_SIZE', 2000)),
+            'max_bytes': int(os.getenv('LOG_BUFFER_MAX_BYTES', 2 * 1024 * 1024))
+        }
+
+    def get_session_settings(self):
+        """Backend de sessões/autenticação ("memory" ou "sqlite")"""
+        return {
+            'backend': os.getenv('SESSION_BACKEND', 'memory'),
+            'path': os.getenv('SESSION_DB_PATH', 'temp/sessions.db'),
+            'sweep_interval': float(os.getenv('SESSION_SWEEP_INTERVAL', '30'))
+        }
+
+    def get_dispatch_settings(self):
+        """Configurações da fila de processamento de webhooks"""
+        return {
+            'workers': int(os.getenv('WEBHOOK_WORKERS', 2 if self.RAILWAY_DEPLOY else 4)),
+            'max_queue': int(os.getenv('WEBHOOK_QUEUE_SIZE', 500 if self.RAILWAY_DEPLOY else 1000)),
+            'drain_timeout': float(os.getenv('WEBHOOK_DRAIN_TIMEOUT', 10)),
+            'dedup_max_entries': int(os.getenv('WEBHOOK_DEDUP_MAX_ENTRIES', 20000 if self.RAILWAY_DEPLOY else 50000)),
+            'dedup_ttl': float(os.getenv('WEBHOOK_DEDUP_TTL', 600))
+        }
+
 # Instância global
 railway_config = RailwayConfig()
 
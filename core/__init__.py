@@ -13,10 +13,34 @@ logger = logging.getLogger(__name__)
 
 # Importar módulo essencial
 from .conversation import SuperConversationEngine
+from .waha import WahaClient, WahaRouter
+from .dispatch import WebhookDispatcher
+from .dedup import WebhookDeduplicator
+from .resilience import CircuitBreaker, SendRateLimiter
+from .outbox import DurableOutbox
+from .context_store import ConversationContextStore
+from .response_cache import ResponseCache
+from .metrics import MetricsRegistry
+from .stats import SharedStats
+from .sessions import create_session_backend
+from .webhook import decode_webhook
 
 # Exportar classe principal
 __all__ = [
-    'SuperConversationEngine'
+    'SuperConversationEngine',
+    'WahaClient',
+    'WahaRouter',
+    'WebhookDispatcher',
+    'WebhookDeduplicator',
+    'CircuitBreaker',
+    'SendRateLimiter',
+    'DurableOutbox',
+    'ConversationContextStore',
+    'ResponseCache',
+    'MetricsRegistry',
+    'SharedStats',
+    'create_session_backend',
+    'decode_webhook'
 ]
 
 # Versão do sistema
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Controle de Admissão - Claudia Cobranças
+Limite de requisições simultâneas por classe de rota (webhook primeiro),
+prazo por requisição, corpo máximo e descarte de carga (503 + Retry-After)
+quando a memória do processo chega perto do limite
+"""
+
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ---- memória ----
+
+def _read_int(path: str) -> Optional[int]:
+    try:
+        with open(path) as f:
+            value = f.read().strip()
+    except OSError:
+        return None
+    return int(value) if value.isdigit() else None  # "max" (cgroup v2 sem limite) → None
+
+def container_memory_limit() -> Optional[int]:
+    """Limite de memória do container (cgroup v2 ou v1), em bytes"""
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        limit = _read_int(path)
+        # cgroup v1 sem limite devolve um número gigante
+        if limit and limit < 1 << 60:
+            return limit
+    return None
+
+def current_rss() -> Optional[int]:
+    """RSS atual do processo, em bytes (Linux); None se não der para ler"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+class MemoryProbe:
+    """📏 Fração do limite de memória em uso, lida no máximo a cada `interval`
+
+    Sem limite conhecido (nem `limit_bytes` nem cgroup) a fração é 0 e nada
+    é descartado por memória.
+    """
+
+    def __init__(self, limit_bytes: Optional[int] = None, interval: float = 0.5):
+        self.limit_bytes = limit_bytes or container_memory_limit()
+        self.interval = interval
+        self.rss: Optional[int] = None
+        self.sampled_at = 0.0
+
+    def usage(self) -> float:
+        now = time.monotonic()
+        if now - self.sampled_at >= self.interval:
+            self.rss = current_rss()
+            self.sampled_at = now
+        if not self.limit_bytes or self.rss is None:
+            return 0.0
+        return self.rss / self.limit_bytes
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "rss_bytes": self.rss,
+            "limit_bytes": self.limit_bytes,
+            "usage": round(self.usage(), 3)
+        }
+
+# ---- classes de rota ----
+
+@dataclass
+class RouteClass:
+    """Orçamento de uma classe de rotas; `priority` menor é atendida antes"""
+    name: str
+    priority: int
+    max_in_flight: Optional[int]   # None = sem limite de concorrência
+    max_body: Optional[int]        # bytes; None = sem limite
+    deadline: Optional[float]      # segundos; None = sem prazo (streams)
+    queue_timeout: float = 0.0     # espera por vaga antes do 503
+    sheddable: bool = True         # pode ser descartada sob pressão de memória
+
+class AdmissionRejected(Exception):
+    def __init__(self, status: int, reason: str, retry_after: Optional[int] = None):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """🚦 Vagas por classe + teto global, com fila curta por prioridade
+
+    Uma requisição entra se a classe e o total estão abaixo do limite e
+    não há ninguém de prioridade igual ou maior esperando. Senão espera
+    até `queue_timeout` (no máximo `max_waiting` na fila); ao liberar uma
+    vaga, os que esperam são acordados em ordem de prioridade, então um
+    webhook passa na frente do dashboard.
+
+    `memory` é qualquer objeto com `usage()` (fração do limite): um
+    `MemoryProbe` ou o `ResourceGovernor`. Sob pressão de memória
+    (`memory_shed_at`) só as classes não
+    descartáveis entram; acima de `memory_critical_at`, só as que estão
+    fora do teto (health, métricas). O descarte por memória vale mesmo
+    com `limiting` desligado: `limiting` controla só as vagas e a fila.
+    """
+
+    def __init__(self, classes: List[RouteClass], classify: Callable[[str], str], max_in_flight: int,
+                 limiting: bool = True, max_waiting: int = 100, memory=None,
+                 memory_shed_at: float = 0.8, memory_critical_at: float = 0.9):
+        self.classes = {route_class.name: route_class for route_class in classes}
+        self.classify = classify
+        self.max_in_flight = max_in_flight
+        self.limiting = limiting
+        self.max_waiting = max_waiting
+        self.memory = memory
+        self.memory_shed_at = memory_shed_at
+        self.memory_critical_at = memory_critical_at
+        self.total = 0
+        self.in_flight = {name: 0 for name in self.classes}
+        self.waiters: List[Tuple[int, int, asyncio.Future, RouteClass]] = []  # heap
+        self.sequence = itertools.count()
+        self.admitted = {name: 0 for name in self.classes}
+        self.rejected: Dict[str, int] = {}
+
+    def route_class(self, path: str) -> RouteClass:
+        return self.classes[self.classify(path)]
+
+    def _counts(self, route_class: RouteClass) -> bool:
+        return route_class.max_in_flight is not None
+
+    def _fits(self, route_class: RouteClass) -> bool:
+        return (self.in_flight[route_class.name] < route_class.max_in_flight
+                and self.total < self.max_in_flight)
+
+    def _reject(self, route_class: RouteClass, reason: str, status: int = 503,
+                retry_after: Optional[int] = 1) -> AdmissionRejected:
+        key = f"{route_class.name}:{reason}"
+        self.rejected[key] = self.rejected.get(key, 0) + 1
+        return AdmissionRejected(status, reason, retry_after)
+
+    def _take(self, route_class: RouteClass):
+        self.in_flight[route_class.name] += 1
+        if self._counts(route_class):
+            self.total += 1
+        self.admitted[route_class.name] += 1
+
+    def check_memory(self, route_class: RouteClass):
+        if self.memory is None:
+            return
+        usage = self.memory.usage()
+        # Crítico: recusa também o webhook; rotas fora do teto (health) passam sempre
+        if (usage >= self.memory_shed_at and route_class.sheddable) or \
+                (usage >= self.memory_critical_at and self._counts(route_class)):
+            raise self._reject(route_class, "memory", retry_after=5)
+
+    async def acquire(self, route_class: RouteClass):
+        self.check_memory(route_class)
+        if not self.limiting or not self._counts(route_class):
+            self._take(route_class)
+            return
+
+        # Sem fila na frente (de prioridade igual ou maior) e com vaga: entra direto
+        if self._fits(route_class) and not any(priority <= route_class.priority for priority, *_ in self.waiters):
+            self._take(route_class)
+            return
+        if route_class.queue_timeout <= 0 or len(self.waiters) >= self.max_waiting:
+            raise self._reject(route_class, "busy")
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (route_class.priority, next(self.sequence), future, route_class)
+        heapq.heappush(self.waiters, entry)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=route_class.queue_timeout)
+        except asyncio.TimeoutError:
+            if future.done():  # vaga chegou junto com o timeout: já contada
+                return
+            future.cancel()
+            self._drop_waiter(entry)
+            raise self._reject(route_class, "queue_timeout")
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release(route_class)  # cliente foi embora depois de ganhar a vaga
+            else:
+                future.cancel()
+                self._drop_waiter(entry)
+            raise
+
+    def _drop_waiter(self, entry):
+        try:
+            self.waiters.remove(entry)
+            heapq.heapify(self.waiters)
+        except ValueError:
+            pass
+
+    def release(self, route_class: RouteClass):
+        self.in_flight[route_class.name] -= 1
+        if self._counts(route_class):
+            self.total -= 1
+        self._wake()
+
+    def _wake(self):
+        """Passar vagas livres para quem espera, por prioridade"""
+        while self.waiters:
+            _, _, future, route_class = self.waiters[0]
+            if future.done():
+                heapq.heappop(self.waiters)
+                continue
+            if not self._fits(route_class):
+                # Vaga global livre mas a classe do primeiro está cheia: tentar os seguintes
+                candidate = next((entry for entry in sorted(self.waiters)
+                                  if not entry[2].done() and self._fits(entry[3])), None)
+                if candidate is None:
+                    return
+                self._drop_waiter(candidate)
+                self._take(candidate[3])
+                candidate[2].set_result(True)
+                continue
+            heapq.heappop(self.waiters)
+            self._take(route_class)
+            future.set_result(True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "limiting": self.limiting,
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.total,
+            "waiting": len(self.waiters),
+            "classes": {
+                name: {
+                    "in_flight": self.in_flight[name],
+                    "max_in_flight": route_class.max_in_flight,
+                    "max_body": route_class.max_body,
+                    "deadline": route_class.deadline,
+                    "admitted": self.admitted[name]
+                }
+                for name, route_class in self.classes.items()
+            },
+            "rejected": dict(self.rejected),
+            "memory_usage": round(self.memory.usage(), 3) if self.memory else None
+        }
+
+# ---- middleware ----
+
+def _json_response(status: int, error: str, retry_after: Optional[int] = None):
+    body = json.dumps({"success": False, "error": error}, ensure_ascii=False).encode("utf-8")
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    if retry_after is not None:
+        headers.append((b"retry-after", str(retry_after).encode()))
+    return {"type": "http.response.start", "status": status, "headers": headers}, \
+           {"type": "http.response.body", "body": body}
+
+ERROR_MESSAGES = {
+    "busy": "Servidor ocupado, tente novamente",
+    "queue_timeout": "Servidor ocupado, tente novamente",
+    "memory": "Servidor sob pressão de memória, tente novamente",
+    "too_large": "Payload muito grande",
+    "deadline": "Tempo limite da requisição excedido",
+}
+
+class AdmissionMiddleware:
+    """ASGI: aplica o `AdmissionController` antes de qualquer rota
+
+    - Content-Length acima do limite da classe → 413 sem ler o corpo;
+      corpo chunked que estoura no meio da leitura → 413 também (a rota
+      enxerga um disconnect e a resposta dela é trocada).
+    - Sem vaga / memória alta → 503 com Retry-After.
+    - Prazo da classe estourado antes de responder → 504.
+    """
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        controller = self.controller
+        route_class = controller.route_class(scope["path"])
+
+        if route_class.max_body is not None:
+            for key, value in scope["headers"]:
+                if key == b"content-length":
+                    if value.isdigit() and int(value) > route_class.max_body:
+                        controller._reject(route_class, "too_large", status=413)
+                        await self._send_error(send, 413, "too_large")
+                        return
+                    break
+
+        try:
+            await controller.acquire(route_class)
+        except AdmissionRejected as e:
+            logger.warning("🚦 Requisição recusada (%s, %s): %s", route_class.name, e.reason, scope["path"])
+            await self._send_error(send, e.status, e.reason, e.retry_after)
+            return
+
+        state = {"started": False, "too_large": False, "received": 0}
+
+        async def limited_receive():
+            message = await receive()
+            if message["type"] == "http.request" and route_class.max_body is not None:
+                state["received"] += len(message.get("body", b""))
+                if state["received"] > route_class.max_body:
+                    state["too_large"] = True
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            if state["too_large"]:
+                # A rota respondeu a um corpo cortado: trocar pela resposta 413
+                if message["type"] == "http.response.start" and not state["started"]:
+                    state["started"] = True
+                    controller._reject(route_class, "too_large", status=413)
+                    await self._send_error(send, 413, "too_large")
+                return
+            if message["type"] == "http.response.start":
+                state["started"] = True
+            await send(message)
+
+        try:
+            if route_class.deadline is None:
+                await self.app(scope, limited_receive, guarded_send)
+            else:
+                await asyncio.wait_for(self.app(scope, limited_receive, guarded_send), route_class.deadline)
+        except asyncio.TimeoutError:
+            controller._reject(route_class, "deadline", status=504, retry_after=None)
+            logger.warning("⏱️ Prazo de %ss excedido: %s", route_class.deadline, scope["path"])
+            if not state["started"]:
+                await self._send_error(send, 504, "deadline")
+        finally:
+            controller.release(route_class)
+
+    @staticmethod
+    async def _send_error(send, status: int, reason: str, retry_after: Optional[int] = None):
+        start, body = _json_response(status, ERROR_MESSAGES.get(reason, reason), retry_after)
+        await send(start)
+        await send(body)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache LRU com TTL - Claudia Cobranças
+Estrutura limitada em tamanho e tempo usada pelos índices em memória
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+_MISSING = object()
+
+class LRUTTLCache:
+    """🗂️ Dicionário limitado por número de itens (LRU) e por idade (TTL)
+
+    Leitura e escrita são O(1) sobre um OrderedDict; itens vencidos são
+    descartados na leitura e em varreduras baratas a partir da ponta mais
+    antiga, sem percorrer o cache inteiro.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.data: "OrderedDict[Hashable, tuple]" = OrderedDict()  # {chave: (valor, expira_em)}
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self.data.get(key)
+        if item is None:
+            self.stats["misses"] += 1
+            return default
+
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.data[key]
+            self.stats["expired"] += 1
+            self.stats["misses"] += 1
+            return default
+
+        self.data.move_to_end(key)
+        self.stats["hits"] += 1
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        self.data[key] = (value, expires_at)
+        self.data.move_to_end(key)
+        self._purge_expired()
+        while len(self.data) > self.max_size:
+            self.data.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        item = self.data.pop(key, None)
+        return default if item is None else item[0]
+
+    def clear(self):
+        self.data.clear()
+
+    def resize(self, max_size: int):
+        """Alterar o limite, descartando os itens mais antigos se preciso"""
+        self.max_size = max(1, max_size)
+        while len(self.data) > self.max_size:
+            self.data.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _purge_expired(self, limit: int = 8):
+        # Com TTL fixo a ordem de inserção aproxima a de expiração: basta
+        # olhar a ponta antiga e parar no primeiro item ainda válido
+        if not self.ttl:
+            return
+        now = time.monotonic()
+        for _ in range(limit):
+            if not self.data:
+                return
+            key, (_, expires_at) = next(iter(self.data.items()))
+            if expires_at > now:
+                return
+            del self.data[key]
+            self.stats["expired"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "size": len(self.data), "max_size": self.max_size, "ttl": self.ttl}
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compressão de Respostas - Claudia Cobranças
+gzip/brotli para respostas JSON e HTML acima de um tamanho mínimo
+(brotli só se o pacote estiver instalado)
+"""
+
+import gzip
+from typing import Dict, Iterable, Optional
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "text/html", "text/plain", "text/css",
+                      "application/javascript", "text/javascript", "image/svg+xml")
+
+def available_encodings() -> tuple:
+    """Codificações suportadas, da preferida para a menos preferida"""
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+def choose_encoding(accept_encoding: Optional[str], offered: Iterable[str]) -> Optional[str]:
+    """Melhor codificação de `offered` aceita pelo cliente (respeita `q=0`)"""
+    if not accept_encoding:
+        return None
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip()] = quality
+    for encoding in offered:
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+def compress(body: bytes, encoding: str, gzip_level: int = 6, brotli_quality: int = 5) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+
+def is_compressible(content_type: str) -> bool:
+    return content_type.split(";", 1)[0].strip().lower() in COMPRESSIBLE_TYPES
+
+class CompressionMiddleware:
+    """🗜️ ASGI: comprime respostas de corpo único (JSON, HTML)
+
+    Só mexe em respostas que chegam inteiras numa mensagem. Streams (SSE
+    de logs/estatísticas) passam direto para não serem segurados em buffer;
+    respostas que já têm Content-Encoding (assets pré-comprimidos) também.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 5,
+                 bytes_counter=None):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.encodings = available_encodings()
+        # Counter com labels (encoding, stage): bytes antes ("original") e depois ("compressed")
+        self.bytes_counter = bytes_counter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = None
+        for key, value in scope["headers"]:
+            if key == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+        encoding = choose_encoding(accept_encoding, self.encodings)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def compressing_send(message):
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                headers = {key.lower(): value for key, value in message.get("headers", [])}
+                content_type = headers.get(b"content-type", b"").decode("latin-1")
+                if b"content-encoding" in headers or not is_compressible(content_type):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message  # segurar até ver o corpo
+                return
+
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            if start_message is None:
+                await send(message)
+                return
+            pending_start, start_message = start_message, None
+
+            # Stream ou corpo pequeno: enviar como veio
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                passthrough = True
+                await send(pending_start)
+                await send(message)
+                return
+
+            compressed = compress(body, encoding, self.gzip_level, self.brotli_quality)
+            if self.bytes_counter is not None:
+                self.bytes_counter.labels(encoding, "original").inc(len(body))
+                self.bytes_counter.labels(encoding, "compressed").inc(len(compressed))
+            headers = []
+            for key, value in pending_start.get("headers", []):
+                if key.lower() == b"content-length":
+                    continue
+                if key.lower() == b"etag" and not value.startswith(b"W/"):
+                    value = b"W/" + value  # mesmo conteúdo, outros bytes: ETag fraco
+                headers.append((key, value))
+            headers.append((b"content-encoding", encoding.encode("latin-1")))
+            headers.append((b"content-length", str(len(compressed)).encode("latin-1")))
+            headers.append((b"vary", b"Accept-Encoding"))
+            await send({**pending_start, "headers": headers})
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, compressing_send)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Contexto de Conversas - Claudia Cobranças
+Memória limitada por chat (última intenção, turnos, pendências) com
+despejo LRU + tempo ocioso e snapshot opcional em disco
+"""
+
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class ConversationContext:
+    """💬 Estado compacto de uma conversa"""
+
+    __slots__ = ("chat_id", "last_intent", "turns", "started_at", "last_seen", "pending_actions")
+
+    def __init__(self, chat_id: str, last_intent: Optional[str] = None, turns: int = 0,
+                 started_at: Optional[float] = None, last_seen: Optional[float] = None,
+                 pending_actions: Tuple[str, ...] = ()):
+        now = time.time()
+        self.chat_id = chat_id
+        self.last_intent = last_intent
+        self.turns = turns
+        self.started_at = started_at if started_at is not None else now
+        self.last_seen = last_seen if last_seen is not None else now
+        self.pending_actions = tuple(pending_actions)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "chat_id": self.chat_id,
+            "last_intent": self.last_intent,
+            "turns": self.turns,
+            "started_at": self.started_at,
+            "last_seen": self.last_seen,
+            "pending_actions": list(self.pending_actions)
+        }
+
+    def size(self) -> int:
+        """Estimativa de bytes ocupados pelo registro"""
+        return (sys.getsizeof(self) + sys.getsizeof(self.chat_id)
+                + sys.getsizeof(self.pending_actions)
+                + sum(sys.getsizeof(action) for action in self.pending_actions))
+
+class ConversationContextStore:
+    """🗃️ Contextos por chat com LRU, TTL ocioso e teto de memória
+
+    O OrderedDict fica ordenado por último acesso, então os contextos
+    ociosos estão sempre na ponta antiga: o despejo por tempo, por número
+    de chats ou por bytes só olha essa ponta. Intenções e ações são
+    strings curtas de um conjunto fixo e ficam internadas.
+    """
+
+    def __init__(self, max_chats: int = 50000, max_bytes: int = 64 * 1024 * 1024,
+                 idle_ttl: float = 21600.0, snapshot_path: Optional[str] = None):
+        self.max_chats = max_chats
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.snapshot_path = snapshot_path
+        self.contexts: "OrderedDict[str, ConversationContext]" = OrderedDict()
+        self.bytes = 0
+        self.stats = {"created": 0, "evicted_idle": 0, "evicted_capacity": 0, "snapshots": 0}
+
+    def __len__(self) -> int:
+        return len(self.contexts)
+
+    def get(self, chat_id: str) -> Optional[ConversationContext]:
+        context = self.contexts.get(chat_id)
+        if context is not None and time.time() - context.last_seen > self.idle_ttl:
+            self._remove(chat_id)
+            self.stats["evicted_idle"] += 1
+            return None
+        return context
+
+    def touch(self, chat_id: str) -> Tuple[ConversationContext, bool]:
+        """Contexto do chat (criado se preciso); o bool indica conversa nova"""
+        context = self.get(chat_id)
+        created = context is None
+        if created:
+            context = ConversationContext(sys.intern(chat_id))
+            self.contexts[chat_id] = context
+            self.bytes += context.size()
+            self.stats["created"] += 1
+        else:
+            self.contexts.move_to_end(chat_id)
+        context.last_seen = time.time()
+        self._evict()
+        return context, created
+
+    def record_turn(self, chat_id: str, intent: str, actions: List[str]):
+        """Registrar o resultado de um turno do engine"""
+        context = self.contexts.get(chat_id)
+        if context is None:
+            context, _ = self.touch(chat_id)
+        self.contexts.move_to_end(chat_id)
+        self.bytes -= context.size()
+        context.last_intent = sys.intern(intent)
+        context.turns += 1
+        context.last_seen = time.time()
+        context.pending_actions = tuple(sys.intern(action) for action in actions)
+        self.bytes += context.size()
+        self._evict()
+
+    def _remove(self, chat_id: str):
+        context = self.contexts.pop(chat_id, None)
+        if context is not None:
+            self.bytes -= context.size()
+
+    def _evict(self):
+        cutoff = time.time() - self.idle_ttl
+        while self.contexts:
+            chat_id, context = next(iter(self.contexts.items()))
+            if context.last_seen < cutoff:
+                self.stats["evicted_idle"] += 1
+            elif len(self.contexts) > self.max_chats or self.bytes > self.max_bytes:
+                self.stats["evicted_capacity"] += 1
+            else:
+                return
+            self._remove(chat_id)
+
+    def resize(self, max_chats: int):
+        """Reduzir (ou ampliar) o número máximo de chats em memória"""
+        self.max_chats = max(1, max_chats)
+        self._evict()
+
+    # ---- snapshot ----
+
+    def snapshot_records(self) -> List[Dict[str, Any]]:
+        """Copiar os contextos para gravação (chamar no event loop)"""
+        return [context.to_dict() for context in self.contexts.values()]
+
+    def write_snapshot(self, records: List[Dict[str, Any]]) -> int:
+        """Gravar registros em disco com escrita atômica (pode rodar em thread)"""
+        if not self.snapshot_path:
+            return 0
+        directory = os.path.dirname(self.snapshot_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Temporário exclusivo no mesmo diretório (o os.replace precisa do mesmo disco)
+        fd, tmp_path = tempfile.mkstemp(prefix=".contexts-", suffix=".tmp", dir=directory or ".")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(records, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_path, self.snapshot_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self.stats["snapshots"] += 1
+        return len(records)
+
+    def load_snapshot(self) -> int:
+        """Restaurar contextos ainda válidos do snapshot; devolve quantos"""
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return 0
+        try:
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                records = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Snapshot de contextos ilegível: {e}")
+            return 0
+
+        cutoff = time.time() - self.idle_ttl
+        for record in sorted(records, key=lambda r: r["last_seen"]):
+            if record["last_seen"] < cutoff:
+                continue
+            context = ConversationContext(
+                sys.intern(record["chat_id"]),
+                sys.intern(record["last_intent"]) if record.get("last_intent") else None,
+                record.get("turns", 0),
+                record.get("started_at"),
+                record["last_seen"],
+                tuple(sys.intern(action) for action in record.get("pending_actions", ()))
+            )
+            self._remove(context.chat_id)
+            self.contexts[context.chat_id] = context
+            self.bytes += context.size()
+        self._evict()
+        logger.info(f"🗃️ {len(self.contexts)} contextos restaurados do snapshot")
+        return len(self.contexts)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "active": len(self.contexts),
+            "max_chats": self.max_chats,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "idle_ttl": self.idle_ttl
+        }
@@ -5,13 +5,18 @@ Sistema de Conversação - Claudia Cobranças
 Versão simplificada e funcional
 """
 
+import hashlib
 import logging
 import re
+import unicodedata
 from datetime import datetime
-from typing import Dict, Any, Optional
+from itertools import islice
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
 from dataclasses import dataclass
 from enum import Enum
 
+from .response_cache import ResponseCache
+
 logger = logging.getLogger(__name__)
 
 class IntentType(Enum):
@@ -27,55 +32,214 @@ class ConversationIntent:
     confidence: float
     emotional_state: str = "neutro"
 
+@dataclass
+class KeywordMatch:
+    """Palavra-chave encontrada na mensagem normalizada"""
+    keyword: str
+    intent: IntentType
+    start: int
+    end: int
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "keyword": self.keyword,
+            "intent": self.intent.value,
+            "start": self.start,
+            "end": self.end
+        }
+
+# Palavras-chave por intenção (a ordem define a prioridade)
+INTENT_KEYWORDS: Dict[IntentType, Tuple[str, ...]] = {
+    IntentType.FATURA_SOLICITAR: ('fatura', 'boleto', 'segunda via'),
+    IntentType.PAGAMENTO_CONFIRMACAO: ('paguei', 'pago', 'pagamento'),
+    IntentType.SAUDACAO: ('oi', 'ola', 'bom dia'),
+    IntentType.DESPEDIDA: ('tchau', 'obrigado', 'valeu'),
+}
+
+# Resposta e ações por intenção
+INTENT_RESPONSES: Dict[IntentType, Tuple[str, List[str]]] = {
+    IntentType.FATURA_SOLICITAR: ("📄 **PERFEITO!** Vou buscar sua fatura! Aguarde um momento...", ["enviar_fatura"]),
+    IntentType.PAGAMENTO_CONFIRMACAO: ("✅ **BELEZA!** Vou verificar seu pagamento no sistema!", ["verificar_pagamento"]),
+    IntentType.SAUDACAO: ("👋 **OLÁ!** Como posso te ajudar hoje?", []),
+    IntentType.DESPEDIDA: ("👋 **VALEU!** Qualquer coisa, me chama!", []),
+    IntentType.DESCONHECIDO: ("🤔 Posso te ajudar com sua **FATURA** ou **PAGAMENTO**!", []),
+}
+
+# Resposta quando a mensagem não é entendida mas há algo pendente da conversa
+PENDING_RESPONSE = ("⏳ Ainda estou cuidando da sua solicitação! "
+                    "Se precisar de outra coisa, fale da sua **FATURA** ou **PAGAMENTO**.")
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Flexões aceitas depois da palavra-chave: plural e diminutivo ("boletos", "tchauzinho")
+_INFLECTION_SUFFIX = r"(?:s|es|zinh[oa]s?)?"
+
+def normalize_message(message: str) -> str:
+    """Normalizar mensagem: minúsculas, sem acentos e espaços colapsados"""
+    decomposed = unicodedata.normalize("NFKD", message.lower())
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _WHITESPACE_RE.sub(" ", stripped).strip()
+
+class IntentMatcher:
+    """🔎 Detector de intenções compilado em uma única regex
+
+    Todas as palavras-chave viram uma alternância só, delimitada por
+    fronteira de palavra, então a mensagem é varrida uma única vez e
+    'oi' não casa mais dentro de "boleto" ou "depois". Depois da palavra
+    são aceitos a última letra repetida ("faturaaa", "oii") e as flexões
+    de `_INFLECTION_SUFFIX`; cada palavra tem seu próprio grupo, e o grupo
+    que casou (`lastindex`) identifica a palavra-chave.
+    """
+
+    def __init__(self, keywords: Optional[Dict[IntentType, Tuple[str, ...]]] = None):
+        self.keywords = keywords if keywords is not None else INTENT_KEYWORDS
+        self.priority = {intent: rank for rank, intent in enumerate(self.keywords)}
+        self.keyword_intent: Dict[str, IntentType] = {}
+        for intent, words in self.keywords.items():
+            for word in words:
+                self.keyword_intent.setdefault(normalize_message(word), intent)
+
+        # Palavras mais longas primeiro para "pagamento" vencer "pago"
+        self.group_keywords = sorted(self.keyword_intent, key=len, reverse=True)
+        alternatives = "|".join(f"({re.escape(word)}){re.escape(word[-1])}*" for word in self.group_keywords)
+        self.pattern = re.compile(r"(?<!\w)(?:" + alternatives + r")" + _INFLECTION_SUFFIX + r"(?!\w)")
+
+    def find(self, normalized: str) -> List[KeywordMatch]:
+        """Encontrar todas as palavras-chave (posições no texto normalizado, com a flexão)"""
+        group_keywords, keyword_intent = self.group_keywords, self.keyword_intent
+        matches = []
+        for m in self.pattern.finditer(normalized):
+            keyword = group_keywords[m.lastindex - 1]
+            matches.append(KeywordMatch(keyword, keyword_intent[keyword], m.start(), m.end()))
+        return matches
+
+    def best_intent(self, matches: List[KeywordMatch]) -> IntentType:
+        """Escolher a intenção de maior prioridade entre as encontradas"""
+        if not matches:
+            return IntentType.DESCONHECIDO
+        return min((match.intent for match in matches), key=self.priority.__getitem__)
+
 class SuperConversationEngine:
     """🧠 Sistema de Conversação - Claudia Cobranças"""
-    
-    def __init__(self):
+
+    def __init__(self, cache_size: int = 0, cache_ttl: Optional[float] = None):
         self.name = "Claudia Cobranças"
+        self.cache = ResponseCache(cache_size, cache_ttl) if cache_size > 0 else None
+        self.load_rules()
         logger.info("🧠 SuperConversationEngine inicializado")
-    
+
+    def load_rules(self, keywords: Optional[Dict[IntentType, Tuple[str, ...]]] = None,
+                   responses: Optional[Dict[IntentType, Tuple[str, List[str]]]] = None):
+        """📚 Carregar (ou trocar) palavras-chave e respostas
+
+        Recompila o detector e gera uma nova `rules_version`; o cache de
+        respostas é invalidado automaticamente na próxima consulta.
+        """
+        self.keywords = keywords if keywords is not None else INTENT_KEYWORDS
+        self.responses = responses if responses is not None else INTENT_RESPONSES
+        self.matcher = IntentMatcher(self.keywords)
+        fingerprint = repr((sorted((i.value, w) for i, w in self.keywords.items()),
+                            sorted((i.value, r) for i, r in self.responses.items()), PENDING_RESPONSE))
+        self.rules_version = hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()[:12]
+
     def process_message(self, message: str, user_context: Optional[Dict] = None) -> Dict[str, Any]:
         """🔄 Processamento da mensagem"""
         try:
             # Normalizar
-            normalized = message.lower().strip()
-            
+            normalized = normalize_message(message)
+
+            # Frases repetidas saem do cache
+            if self.cache is not None:
+                key = self.cache.make_key(normalized, user_context)
+                cached = self.cache.get(key, self.rules_version)
+                if cached is not None:
+                    return cached
+
             # Detectar intenção
-            if any(word in normalized for word in ['fatura', 'boleto', 'segunda via']):
-                intent = IntentType.FATURA_SOLICITAR
-                response = "📄 **PERFEITO!** Vou buscar sua fatura! Aguarde um momento..."
-                actions = ["enviar_fatura"]
-            elif any(word in normalized for word in ['paguei', 'pago', 'pagamento']):
-                intent = IntentType.PAGAMENTO_CONFIRMACAO
-                response = "✅ **BELEZA!** Vou verificar seu pagamento no sistema!"
-                actions = ["verificar_pagamento"]
-            elif any(word in normalized for word in ['oi', 'ola', 'bom dia']):
-                intent = IntentType.SAUDACAO
-                response = "👋 **OLÁ!** Como posso te ajudar hoje?"
-                actions = []
-            elif any(word in normalized for word in ['tchau', 'obrigado', 'valeu']):
-                intent = IntentType.DESPEDIDA
-                response = "👋 **VALEU!** Qualquer coisa, me chama!"
-                actions = []
-            else:
-                intent = IntentType.DESCONHECIDO
-                response = "🤔 Posso te ajudar com sua **FATURA** ou **PAGAMENTO**!"
-                actions = []
-            
-            return {
-                "success": True,
-                "response": response,
-                "intent": intent.value,
-                "confidence": 0.8,
-                "actions": actions
-            }
-            
+            result = self._build_result(self.matcher.find(normalized), user_context)
+            if self.cache is not None:
+                self.cache.set(key, result, self.rules_version)
+            return result
+
         except Exception as e:
             logger.error(f"❌ Erro: {e}")
-            return {
-                "success": False,
-                "response": "😅 Pode repetir sua mensagem?",
-                "intent": "erro",
-                "confidence": 0.0,
-                "actions": []
-            } 
\ No newline at end of file
+            return self._error_result()
+
+    def process_messages(self, items: Iterable[Tuple[str, Optional[Dict]]],
+                         chunk_size: int = 512) -> Iterator[Dict[str, Any]]:
+        """📦 Processamento em lote de pares (mensagem, contexto)
+
+        Consome o iterável em blocos de `chunk_size`: normaliza e consulta o
+        cache do bloco inteiro, passa só as mensagens fora do cache pelo
+        detector e devolve os resultados um a um, na mesma ordem da
+        entrada. Só um bloco fica em memória, então é seguro para replays
+        grandes vindos de um gerador.
+        """
+        iterator = iter(items)
+        normalize = normalize_message
+        find = self.matcher.find
+        cache = self.cache
+
+        while True:
+            chunk = list(islice(iterator, chunk_size))
+            if not chunk:
+                return
+
+            try:
+                normalized = [normalize(message) for message, _ in chunk]
+                results: List[Optional[Dict[str, Any]]] = [None] * len(chunk)
+                keys: List[Any] = [None] * len(chunk)
+                if cache is not None:
+                    for i, (text, (_, context)) in enumerate(zip(normalized, chunk)):
+                        keys[i] = cache.make_key(text, context)
+                        results[i] = cache.get(keys[i], self.rules_version)
+
+                # Só as mensagens fora do cache passam pelo detector
+                missing = [i for i, result in enumerate(results) if result is None]
+            except Exception as e:
+                # Bloco com mensagem inválida: cair para o processamento individual
+                logger.error(f"❌ Erro no lote, processando individualmente: {e}")
+                for message, context in chunk:
+                    yield self.process_message(message, context)
+                continue
+
+            for i in missing:
+                try:
+                    results[i] = self._build_result(find(normalized[i]), chunk[i][1])
+                    if cache is not None:
+                        cache.set(keys[i], results[i], self.rules_version)
+                except Exception as e:
+                    # Mesmo resultado do processamento individual, só para esta mensagem
+                    logger.error(f"❌ Erro: {e}")
+                    results[i] = self._error_result()
+
+            yield from results
+
+    def _build_result(self, matches: List[KeywordMatch], user_context: Optional[Dict] = None) -> Dict[str, Any]:
+        intent = self.matcher.best_intent(matches)
+        response, actions = self.responses[intent]
+
+        # Contexto da conversa: mensagem não entendida logo após um pedido
+        # ainda pendente é tratada como acompanhamento desse pedido
+        previous_intent = user_context.get("last_intent") if user_context else None
+        if intent == IntentType.DESCONHECIDO and user_context and user_context.get("pending_actions"):
+            response = PENDING_RESPONSE
+
+        return {
+            "success": True,
+            "response": response,
+            "intent": intent.value,
+            "previous_intent": previous_intent,
+            "confidence": 0.8,
+            "actions": list(actions),
+            "matches": [match.to_dict() for match in matches]
+        }
+
+    def _error_result(self) -> Dict[str, Any]:
+        return {
+            "success": False,
+            "response": "😅 Pode repetir sua mensagem?",
+            "intent": "erro",
+            "confidence": 0.0,
+            "actions": []
+        }
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Deduplicação de Webhooks - Claudia Cobranças
+Descarta entregas repetidas do WAHA antes de rodar o engine
+"""
+
+import hashlib
+import logging
+from typing import Any, Dict, Optional
+
+from .cache import LRUTTLCache
+
+logger = logging.getLogger(__name__)
+
+def message_dedup_key(message_data: Dict[str, Any]) -> Optional[str]:
+    """Chave de deduplicação de uma mensagem do WAHA
+
+    Usa o id da mensagem quando existe (string ou {"_serialized": ...});
+    sem id, cai para o hash de (chatId, corpo, timestamp).
+    """
+    message_id = message_data.get("id")
+    if isinstance(message_id, dict):
+        message_id = message_id.get("_serialized") or message_id.get("id")
+    if message_id:
+        return f"id:{message_id}"
+
+    chat_id = message_data.get("from") or message_data.get("chatId")
+    body = message_data.get("body")
+    timestamp = message_data.get("timestamp")
+    if not chat_id or body is None or timestamp is None:
+        return None
+
+    digest = hashlib.blake2b(f"{chat_id}\x1f{body}\x1f{timestamp}".encode("utf-8"), digest_size=16)
+    return f"h:{digest.hexdigest()}"
+
+class WebhookDeduplicator:
+    """🧹 Índice LRU+TTL de mensagens já aceitas
+
+    O mesmo texto chega pelo evento `message`, pelo `engine.event` de
+    `unread_count` e por reentregas do WAHA; só a primeira ocorrência
+    dentro do TTL segue para o engine.
+    """
+
+    def __init__(self, max_entries: int = 50000, ttl: float = 600.0):
+        self.index = LRUTTLCache(max_size=max_entries, ttl=ttl)
+        self.stats = {"accepted": 0, "duplicates_suppressed": 0, "without_key": 0}
+
+    def mark(self, key: Optional[str]) -> bool:
+        """Registrar a chave; False se ela já foi vista (duplicata)"""
+        if key is None:
+            self.stats["without_key"] += 1
+            return True
+        if key in self.index:
+            self.stats["duplicates_suppressed"] += 1
+            return False
+        self.index.set(key, True)
+        self.stats["accepted"] += 1
+        return True
+
+    def forget(self, key: Optional[str]):
+        """Desfazer `mark` (ex.: fila cheia, o WAHA vai reenviar)"""
+        if key is not None and self.index.pop(key) is not None:
+            self.stats["accepted"] -= 1
+
+    def resize(self, max_entries: int):
+        """Alterar o tamanho do índice (descarta as chaves mais antigas)"""
+        self.index.resize(max_entries)
+
+    def get_stats(self) -> Dict[str, Any]:
+        index = self.index.get_stats()
+        return {
+            **self.stats,
+            "size": index["size"],
+            "max_size": index["max_size"],
+            "ttl": index["ttl"],
+            "evictions": index["evictions"] + index["expired"]
+        }
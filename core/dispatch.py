@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Despacho de Mensagens - Claudia Cobranças
+Fila limitada + pool de workers asyncio para processar webhooks fora
+do request do WAHA, em ordem por conversa
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class WebhookDispatcher:
+    """📬 Fila limitada drenada por workers asyncio, serializada por chat
+
+    O webhook só enfileira e responde; os workers executam o handler
+    (engine + envio ao WAHA). Cada chat tem sua própria fila de pendências
+    e só um worker por vez trabalha em um chat, então as respostas de um
+    devedor saem na ordem de chegada enquanto chats diferentes rodam em
+    paralelo. O estado do chat é descartado assim que sua fila esvazia.
+
+    Com `max_queue` itens pendentes `submit` devolve False e quem chamou
+    decide como sinalizar backpressure (503 + Retry-After).
+    """
+
+    def __init__(self, handler: Callable[..., Awaitable[Any]], workers: int = 4, max_queue: int = 1000):
+        self.handler = handler
+        self.worker_count = workers
+        self.max_queue = max_queue
+        self.ready: Optional[asyncio.Queue] = None               # chats com trabalho e sem worker
+        self.chats: Dict[str, Deque[Tuple[float, tuple]]] = {}   # {chat: pendências em ordem}
+        self.pending = 0
+        self.idle: Optional[asyncio.Event] = None
+        self.workers: List[asyncio.Task] = []
+        self.busy = 0
+        self.started_at = 0.0
+        self.stats = {
+            "enqueued": 0,
+            "processed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "max_depth": 0,
+            "max_chats": 0,
+            "wait_total": 0.0,
+            "wait_max": 0.0,
+            "busy_time": 0.0
+        }
+
+    async def start(self):
+        """Criar a fila e subir os workers"""
+        if self.workers:
+            return
+        self.ready = asyncio.Queue()
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.started_at = time.monotonic()
+        self.workers = [asyncio.create_task(self._worker(i)) for i in range(self.worker_count)]
+        logger.info(f"📬 Dispatcher iniciado ({self.worker_count} workers, fila={self.max_queue})")
+
+    async def stop(self, timeout: float = 10.0):
+        """Drenar a fila (até `timeout`) e encerrar os workers"""
+        if not self.workers:
+            return
+        try:
+            await asyncio.wait_for(self.idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Dispatcher encerrado com {self.pending} itens na fila")
+        for task in self.workers:
+            task.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        logger.info("📬 Dispatcher encerrado")
+
+    def submit(self, key: str, *args: Any) -> bool:
+        """Enfileirar trabalho do chat `key` sem bloquear; False se a fila estiver cheia"""
+        if self.ready is None:
+            raise RuntimeError("Dispatcher não iniciado")
+        if self.pending >= self.max_queue:
+            self.stats["rejected"] += 1
+            return False
+
+        job = (time.monotonic(), args)
+        jobs = self.chats.get(key)
+        if jobs is None:
+            # Chat sem trabalho: criar fila e agendar para um worker
+            self.chats[key] = deque((job,))
+            self.ready.put_nowait(key)
+            if len(self.chats) > self.stats["max_chats"]:
+                self.stats["max_chats"] = len(self.chats)
+        else:
+            # Chat já agendado ou em execução: entra atrás das anteriores
+            jobs.append(job)
+
+        self.pending += 1
+        self.idle.clear()
+        self.stats["enqueued"] += 1
+        if self.pending > self.stats["max_depth"]:
+            self.stats["max_depth"] = self.pending
+        return True
+
+    async def _worker(self, number: int):
+        while True:
+            key = await self.ready.get()
+            jobs = self.chats[key]
+            enqueued_at, args = jobs.popleft()
+            started = time.monotonic()
+            wait = started - enqueued_at
+            self.stats["wait_total"] += wait
+            if wait > self.stats["wait_max"]:
+                self.stats["wait_max"] = wait
+
+            self.busy += 1
+            try:
+                await self.handler(*args)
+                self.stats["processed"] += 1
+            except Exception as e:
+                self.stats["failed"] += 1
+                logger.error(f"❌ Erro no worker {number}: {e}")
+            finally:
+                self.busy -= 1
+                self.stats["busy_time"] += time.monotonic() - started
+                self.pending -= 1
+
+                # Um item por vez: chats com mais pendências voltam ao fim
+                # da fila de prontos para não monopolizar o worker
+                if jobs:
+                    self.ready.put_nowait(key)
+                else:
+                    del self.chats[key]
+                if not self.pending:
+                    self.idle.set()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Profundidade da fila, tempo de espera e utilização dos workers"""
+        done = self.stats["processed"] + self.stats["failed"]
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+        capacity = elapsed * self.worker_count
+        return {
+            "enqueued": self.stats["enqueued"],
+            "processed": self.stats["processed"],
+            "failed": self.stats["failed"],
+            "rejected": self.stats["rejected"],
+            "queue_depth": self.pending,
+            "queue_max": self.max_queue,
+            "max_depth": self.stats["max_depth"],
+            "active_chats": len(self.chats),
+            "max_chats": self.stats["max_chats"],
+            "avg_wait_ms": round(self.stats["wait_total"] / done * 1000, 2) if done else 0.0,
+            "max_wait_ms": round(self.stats["wait_max"] * 1000, 2),
+            "workers": self.worker_count,
+            "busy_workers": self.busy,
+            "utilization": round(self.stats["busy_time"] / capacity, 4) if capacity else 0.0
+        }
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Governança de Recursos - Claudia Cobranças
+Aplica os limiares do GC e acompanha o RSS contra o limite do container,
+encolhendo caches em degraus conforme a pressão de memória sobe
+"""
+
+import asyncio
+import gc
+import logging
+from collections import deque
+from datetime import datetime
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from .admission import MemoryProbe
+
+logger = logging.getLogger(__name__)
+
+NORMAL, ELEVATED, HIGH, CRITICAL = range(4)
+LEVEL_NAMES = ("normal", "elevated", "high", "critical")
+
+# Fração do tamanho original de cada cache em cada nível
+CACHE_FACTORS = (1.0, 0.5, 0.25, 0.1)
+
+@dataclass
+class ManagedCache:
+    name: str
+    resize: Callable[[int], None]
+    baseline: int
+    minimum: int = 100
+    current: int = 0
+
+class ResourceGovernor:
+    """🧠 Degraus de memória: normal → elevated → high → critical
+
+    - elevated (a partir de 85% de `max_usage`): caches pela metade
+    - high (`max_usage`, ex. 0.8 do limite): caches a 1/4 e `gc.collect()`;
+      o controle de admissão passa a recusar rotas descartáveis
+    - critical (`critical_usage`): caches a 1/10; admissão recusa também
+      o webhook (ver `AdmissionController.check_memory`)
+
+    Sobe de nível na hora; desce um degrau por vez e só depois de
+    `cooldown` amostras abaixo do limiar (com folga de `hysteresis`), para
+    não ficar encolhendo e crescendo os caches a cada amostra.
+    """
+
+    def __init__(self, probe: MemoryProbe, max_usage: float = 0.8, critical_usage: float = 0.9,
+                 interval: float = 5.0, gc_threshold: Optional[Tuple[int, ...]] = None,
+                 hysteresis: float = 0.05, cooldown: int = 3):
+        self.probe = probe
+        self.thresholds = (0.0, max_usage * 0.85, max_usage, critical_usage)
+        self.interval = interval
+        self.gc_threshold = tuple(gc_threshold) if gc_threshold else None
+        self.hysteresis = hysteresis
+        self.cooldown = cooldown
+        self.caches: List[ManagedCache] = []
+        self.level = NORMAL
+        self.calm_samples = 0
+        self.samples = 0
+        self.collections = 0
+        self.decisions: Deque[Dict[str, Any]] = deque(maxlen=20)
+        self.task: Optional[asyncio.Task] = None
+
+    def register_cache(self, name: str, resize: Callable[[int], None], baseline: int, minimum: int = 100):
+        """Registrar um cache encolhível (`resize(novo_tamanho)`)"""
+        if baseline > 0:
+            self.caches.append(ManagedCache(name, resize, baseline, min(minimum, baseline), baseline))
+
+    def apply_gc_threshold(self):
+        if self.gc_threshold:
+            previous = gc.get_threshold()
+            gc.set_threshold(*self.gc_threshold)
+            logger.info(f"🧠 gc.set_threshold{self.gc_threshold} (antes {previous})")
+
+    def usage(self) -> float:
+        """Fração do limite em uso (usado também pelo controle de admissão)"""
+        return self.probe.usage()
+
+    async def start(self):
+        self.apply_gc_threshold()
+        if self.task is None and self.probe.limit_bytes:
+            self.task = asyncio.create_task(self._run())
+        elif not self.probe.limit_bytes:
+            logger.info("🧠 Limite de memória desconhecido: governança de caches desligada")
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.evaluate(self.usage())
+            except Exception as e:
+                logger.error(f"❌ Erro na governança de memória: {e}")
+
+    def _target_level(self, usage: float) -> int:
+        level = NORMAL
+        for candidate in (ELEVATED, HIGH, CRITICAL):
+            if usage >= self.thresholds[candidate]:
+                level = candidate
+        return level
+
+    def evaluate(self, usage: float):
+        """Uma amostra: decidir o nível e aplicar as ações de transição"""
+        self.samples += 1
+        target = self._target_level(usage)
+        if target > self.level:
+            self.calm_samples = 0
+            self._transition(target, usage)
+        elif self.level > NORMAL and usage < self.thresholds[self.level] - self.hysteresis:
+            self.calm_samples += 1
+            if self.calm_samples >= self.cooldown:
+                self.calm_samples = 0
+                self._transition(self.level - 1, usage)
+        else:
+            self.calm_samples = 0
+
+    def _transition(self, level: int, usage: float):
+        previous, self.level = self.level, level
+        actions = []
+        factor = CACHE_FACTORS[level]
+        for cache in self.caches:
+            size = max(cache.minimum, int(cache.baseline * factor))
+            if size != cache.current:
+                cache.resize(size)
+                actions.append(f"{cache.name}: {cache.current} → {size}")
+                cache.current = size
+        if level >= HIGH and level > previous:
+            gc.collect()
+            self.collections += 1
+            actions.append("gc.collect()")
+
+        self.decisions.append({
+            "at": datetime.now().isoformat(),
+            "from": LEVEL_NAMES[previous],
+            "to": LEVEL_NAMES[level],
+            "usage": round(usage, 3),
+            "rss_bytes": self.probe.rss,
+            "actions": actions
+        })
+        log = logger.warning if level > previous else logger.info
+        log(f"🧠 Memória {usage:.0%} do limite: {LEVEL_NAMES[previous]} → {LEVEL_NAMES[level]} "
+            f"({'; '.join(actions) or 'sem ações'})")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "level": LEVEL_NAMES[self.level],
+            **self.probe.get_stats(),
+            "thresholds": {LEVEL_NAMES[level]: round(self.thresholds[level], 3) for level in (ELEVATED, HIGH, CRITICAL)},
+            "gc_threshold": list(gc.get_threshold()),
+            "gc_collections": self.collections,
+            "samples": self.samples,
+            "caches": {cache.name: {"size_limit": cache.current, "baseline": cache.baseline}
+                       for cache in self.caches},
+            "decisions": list(self.decisions)
+        }
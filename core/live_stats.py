@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Estatísticas ao Vivo - Claudia Cobranças
+Um único broadcaster monta o /api/stats a cada tick e empurra só o que
+mudou para todos os dashboards conectados (Server-Sent Events)
+"""
+
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+def stats_delta(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """Diferença entre dois snapshots, no formato de um JSON merge patch
+
+    Dicts são comparados recursivamente; listas e valores simples são
+    trocados inteiros. Chave que sumiu vira None.
+    """
+    delta: Dict[str, Any] = {}
+    for key, value in new.items():
+        previous = old.get(key)
+        if isinstance(value, dict) and isinstance(previous, dict):
+            nested = stats_delta(previous, value)
+            if nested:
+                delta[key] = nested
+        elif key not in old or previous != value:
+            delta[key] = value
+    for key in old.keys() - new.keys():
+        delta[key] = None
+    return delta
+
+def merge_delta(target: Dict[str, Any], delta: Dict[str, Any]) -> Dict[str, Any]:
+    """Aplicar `delta` sobre `target` (in-place); usado para juntar deltas pendentes"""
+    for key, value in delta.items():
+        if isinstance(value, dict):
+            # Copiar: o delta de origem é compartilhado entre conexões; valor
+            # anterior que não é dict (None, número) é substituído
+            if not isinstance(target.get(key), dict):
+                target[key] = {}
+            merge_delta(target[key], value)
+        else:
+            target[key] = value
+    return target
+
+class StatsSubscriber:
+    """Um dashboard conectado: guarda só o próximo envio, já combinado
+
+    Cliente lento não acumula fila: deltas que chegam antes do envio são
+    fundidos num só, então a memória por conexão é limitada ao tamanho
+    das estatísticas.
+    """
+
+    def __init__(self):
+        self.wakeup = asyncio.Event()
+        self.version = 0
+        self.pending: Optional[Dict[str, Any]] = None
+        self.pending_text: Optional[str] = None
+        self.closed = False  # o stream deve encerrar (cliente reconecta e recebe snapshot)
+
+    def push(self, version: int, delta: Dict[str, Any], text: str):
+        if self.pending is None:
+            # Caso comum: o texto serializado é compartilhado entre todos
+            self.pending, self.pending_text = delta, text
+        else:
+            if self.pending_text is not None:
+                # Ainda é o delta compartilhado: copiar antes de fundir
+                self.pending, self.pending_text = json.loads(self.pending_text), None
+            merge_delta(self.pending, delta)
+        self.version = version
+        self.wakeup.set()
+
+    def take(self) -> Optional[str]:
+        """Próximo delta serializado (None se nada mudou desde o último envio)"""
+        self.wakeup.clear()
+        if self.pending is None:
+            return None
+        text = self.pending_text or json.dumps(self.pending, ensure_ascii=False, default=str)
+        self.pending = self.pending_text = None
+        return text
+
+class StatsBroadcaster:
+    """📡 Monta as estatísticas uma vez por tick e distribui os deltas
+
+    O custo por tick (uma chamada de `build` + uma serialização) é o mesmo
+    com um ou com vinte dashboards abertos; sem ninguém conectado o tick
+    não monta nada.
+    """
+
+    def __init__(self, build: Callable[[], Awaitable[Dict[str, Any]]], interval: float = 2.0):
+        self.build = build
+        self.interval = interval
+        self.subscribers: Set[StatsSubscriber] = set()
+        self.snapshot: Optional[Dict[str, Any]] = None
+        self.snapshot_text = ""
+        self.snapshot_at = 0.0
+        self.version = 0
+        self.lock = asyncio.Lock()
+        self.task: Optional[asyncio.Task] = None
+        self.closed = False
+        self.builds = 0
+        self.deltas_sent = 0
+        self.errors = 0
+
+    async def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Parar o tick e encerrar as conexões abertas"""
+        self.closed = True
+        for subscriber in list(self.subscribers):
+            subscriber.wakeup.set()
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def subscribe(self) -> StatsSubscriber:
+        """Registrar um dashboard; o snapshot completo fica em `snapshot_text`"""
+        if self.snapshot is None or time.monotonic() - self.snapshot_at > self.interval:
+            await self.refresh()
+        subscriber = StatsSubscriber()
+        subscriber.version = self.version
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: StatsSubscriber):
+        self.subscribers.discard(subscriber)
+
+    async def refresh(self):
+        """Montar um snapshot novo e publicar o que mudou"""
+        async with self.lock:
+            snapshot = await self.build()
+            self.builds += 1
+            previous = self.snapshot
+            self.snapshot = snapshot
+            self.snapshot_text = json.dumps(snapshot, ensure_ascii=False, default=str)
+            self.snapshot_at = time.monotonic()
+            if previous is None:
+                self.version += 1
+                return
+            delta = stats_delta(previous, snapshot)
+            if not delta:
+                return
+            self.version += 1
+            text = json.dumps(delta, ensure_ascii=False, default=str)
+            for subscriber in list(self.subscribers):
+                try:
+                    subscriber.push(self.version, delta, text)
+                    self.deltas_sent += 1
+                except Exception as e:
+                    # Estado do cliente ficou inconsistente: encerrar o stream dele
+                    self.errors += 1
+                    logger.error(f"❌ Erro ao enfileirar delta de estatísticas: {e}")
+                    subscriber.closed = True
+                    subscriber.wakeup.set()
+                    self.unsubscribe(subscriber)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if not self.subscribers:
+                continue
+            try:
+                await self.refresh()
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"❌ Erro ao montar estatísticas ao vivo: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "subscribers": len(self.subscribers),
+            "interval": self.interval,
+            "version": self.version,
+            "builds": self.builds,
+            "deltas_sent": self.deltas_sent,
+            "errors": self.errors
+        }
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Buffer de Logs - Claudia Cobranças
+Últimos registros em memória (anel limitado por quantidade e bytes) para
+o /api/logs, com paginação por cursor e tail ao vivo
+"""
+
+import asyncio
+import logging
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+# Texto guardado por registro; o resto continua só no stdout
+MAX_MESSAGE_CHARS = 2000
+
+def parse_level(level: Optional[str]) -> int:
+    """Nome ('warning') ou número do nível mínimo; vazio = todos"""
+    if not level:
+        return logging.NOTSET
+    if level.isdigit():
+        return int(level)
+    value = logging.getLevelName(level.upper())
+    return value if isinstance(value, int) else logging.NOTSET
+
+class LogRingBuffer:
+    """📋 Anel de registros com ids sequenciais
+
+    Os ids são contíguos dentro do deque, então a posição de um cursor é
+    `id - primeiro_id`: paginar sem filtro custa O(limite). Escritas vêm
+    da thread de logging e leituras do event loop, por isso o lock; quem
+    acompanha o tail é acordado via `call_soon_threadsafe`.
+    """
+
+    def __init__(self, max_entries: int = 2000, max_bytes: int = 2 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries: Deque[Tuple[int, int, Dict[str, Any]]] = deque()  # (id, bytes, registro)
+        self.bytes = 0
+        self.next_id = 1
+        self.evicted = 0
+        self.lock = threading.Lock()
+        self.subscribers: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+        self.closed = False
+
+    def append(self, record: logging.LogRecord, message: str):
+        message = message if len(message) <= MAX_MESSAGE_CHARS else message[:MAX_MESSAGE_CHARS] + "…"
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "levelno": record.levelno,
+            "logger": record.name,
+            "message": message,
+            "chat": getattr(record, "chat", None),
+        }
+        size = len(message) + len(record.name) + 96
+        with self.lock:
+            entry["id"] = self.next_id
+            self.next_id += 1
+            self.entries.append((entry["id"], size, entry))
+            self.bytes += size
+            while self.entries and (len(self.entries) > self.max_entries or self.bytes > self.max_bytes):
+                _, old_size, _ = self.entries.popleft()
+                self.bytes -= old_size
+                self.evicted += 1
+            subscribers = list(self.subscribers)
+        for loop, event in subscribers:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # loop já encerrado
+
+    @staticmethod
+    def _matches(entry: Dict[str, Any], min_level: int, chat: Optional[str]) -> bool:
+        return entry["levelno"] >= min_level and (chat is None or entry["chat"] == chat)
+
+    def page(self, before: Optional[int] = None, limit: int = 100, min_level: int = logging.NOTSET,
+             chat: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """Registros mais novos primeiro, com id < `before`; devolve (página, próximo cursor)"""
+        with self.lock:
+            if not self.entries:
+                return [], None
+            first_id = self.entries[0][0]
+            end = len(self.entries) if before is None else max(0, min(len(self.entries), before - first_id))
+            page: List[Dict[str, Any]] = []
+            index = end - 1
+            while index >= 0 and len(page) < limit:
+                entry = self.entries[index][2]
+                if self._matches(entry, min_level, chat):
+                    page.append(entry)
+                index -= 1
+            # Próxima página começa no último id examinado; None quando acabou
+            next_cursor = self.entries[index + 1][0] if index >= 0 else None
+        return page, next_cursor
+
+    def since(self, after: int, min_level: int = logging.NOTSET, chat: Optional[str] = None,
+              limit: int = 500) -> List[Dict[str, Any]]:
+        """Registros com id > `after`, mais antigos primeiro (para o tail)"""
+        with self.lock:
+            if not self.entries:
+                return []
+            first_id = self.entries[0][0]
+            start = max(0, after + 1 - first_id)
+            result = []
+            for index in range(start, len(self.entries)):
+                entry = self.entries[index][2]
+                if self._matches(entry, min_level, chat):
+                    result.append(entry)
+                    if len(result) >= limit:
+                        break
+        return result
+
+    @property
+    def latest_id(self) -> int:
+        return self.next_id - 1
+
+    def subscribe(self) -> Tuple[asyncio.AbstractEventLoop, asyncio.Event]:
+        subscriber = (asyncio.get_running_loop(), asyncio.Event())
+        with self.lock:
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Tuple[asyncio.AbstractEventLoop, asyncio.Event]):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def close(self):
+        """Encerrar os tails abertos (shutdown)"""
+        self.closed = True
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for loop, event in subscribers:
+            loop.call_soon_threadsafe(event.set)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "evicted": self.evicted,
+            "latest_id": self.latest_id,
+            "subscribers": len(self.subscribers)
+        }
+
+class RingBufferHandler(logging.Handler):
+    """Handler que copia cada registro emitido para o `LogRingBuffer`
+
+    Roda no listener do pipeline de logs, então a formatação da mensagem
+    continua fora do event loop.
+    """
+
+    def __init__(self, buffer: LogRingBuffer):
+        super().__init__()
+        self.buffer = buffer
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            self.buffer.append(record, record.getMessage())
+        except Exception:
+            self.handleError(record)
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Logging Assíncrono - Claudia Cobranças
+Fila em memória entre quem loga e o stdout: o event loop só enfileira o
+registro; formatação (JSON ou texto) e escrita rodam numa thread
+"""
+
+import json
+import logging
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Iterable, Optional
+
+# Atributos padrão do LogRecord; o resto veio de `extra=` e vai para o JSON
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+class JsonFormatter(logging.Formatter):
+    """📄 Uma linha JSON por registro (campos de `extra=` incluídos)"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class LevelSampler(logging.Filter):
+    """🎲 Amostragem por nível: `rates` = {logging.INFO: 0.1, ...}
+
+    Níveis fora de `rates` passam sempre; ERROR e CRITICAL nunca são
+    amostrados, mesmo que configurados.
+    """
+
+    def __init__(self, rates: Optional[Dict[int, float]] = None):
+        super().__init__()
+        self.rates = {level: rate for level, rate in (rates or {}).items() if level < logging.ERROR}
+        self.sampled_out = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.rates.get(record.levelno)
+        if rate is None or rate >= 1.0:
+            return True
+        if random.random() < rate:
+            return True
+        self.sampled_out += 1
+        return False
+
+class DeferredQueueHandler(QueueHandler):
+    """QueueHandler que não formata na thread de quem loga
+
+    O `QueueHandler` padrão junta `msg % args` antes de enfileirar; aqui o
+    registro vai como está e a formatação acontece no listener. Só o
+    traceback é renderizado na hora, para não prender frames na fila.
+    Fila cheia descarta o registro (e conta) em vez de bloquear o loop.
+    """
+
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]"):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class CountingStreamHandler(logging.StreamHandler):
+    """StreamHandler que conta o que efetivamente foi escrito"""
+
+    def __init__(self, stream=None):
+        super().__init__(stream)
+        self.emitted = 0
+
+    def emit(self, record: logging.LogRecord):
+        super().emit(record)
+        self.emitted += 1
+
+class LoggingPipeline:
+    """📝 Logging não bloqueante do processo
+
+    `start()` troca os handlers do root (e do uvicorn) por um único
+    `DeferredQueueHandler`; um `QueueListener` numa thread formata e
+    escreve no stdout. `detailed` liga DEBUG só nos loggers do próprio app
+    (trilha por mensagem), sem abrir DEBUG de httpx/asyncio.
+    """
+
+    def __init__(self, level: str = "INFO", json_output: bool = True, detailed: bool = False,
+                 sample_rates: Optional[Dict[str, float]] = None, queue_size: int = 10000):
+        self.level = logging.getLevelName(level.upper()) if isinstance(level, str) else level
+        if not isinstance(self.level, int):
+            self.level = logging.INFO
+        self.json_output = json_output
+        self.detailed = detailed
+        self.queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=queue_size)
+        self.sampler = LevelSampler({logging.getLevelName(name.upper()): rate
+                                     for name, rate in (sample_rates or {}).items()})
+        self.handler = DeferredQueueHandler(self.queue)
+        self.handler.addFilter(self.sampler)
+        self.output = CountingStreamHandler(sys.stdout)
+        self.output.setFormatter(JsonFormatter() if json_output
+                                 else logging.Formatter("%(levelname)s:%(name)s:%(message)s"))
+        self.listener: Optional[QueueListener] = None
+
+    def start(self, detailed_loggers: Iterable[str] = (), extra_handlers: Iterable[logging.Handler] = ()):
+        """Instalar a fila; `extra_handlers` também rodam no listener (ex.: buffer do /api/logs)"""
+        if self.listener is not None:
+            return
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(self.handler)
+        root.setLevel(self.level)
+        self.capture_uvicorn()
+
+        if self.detailed:
+            for name in detailed_loggers:
+                logging.getLogger(name).setLevel(min(self.level, logging.DEBUG))
+
+        self.listener = QueueListener(self.queue, self.output, *extra_handlers, respect_handler_level=True)
+        self.listener.start()
+
+    def capture_uvicorn(self):
+        """Passar os logs do uvicorn (inclusive o access log) pela fila
+
+        O uvicorn reinstala seus handlers ao subir, então chamar de novo no
+        startup do app quando ele foi importado antes de `uvicorn.run`.
+        """
+        for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+            uvicorn_logger = logging.getLogger(name)
+            uvicorn_logger.handlers = []
+            uvicorn_logger.propagate = True
+
+    def stop(self):
+        """Esvaziar a fila e parar a thread de escrita"""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        self.output.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "level": logging.getLevelName(self.level),
+            "format": "json" if self.json_output else "text",
+            "detailed": self.detailed,
+            "queued": self.queue.qsize(),
+            "emitted": self.output.emitted,
+            "dropped_queue_full": self.handler.dropped,
+            "sampled_out": self.sampler.sampled_out,
+            "sample_rates": {logging.getLevelName(level): rate for level, rate in self.sampler.rates.items()}
+        }
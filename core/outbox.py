@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fila de Saída Durável - Claudia Cobranças
+Respostas que não puderam ser entregues ao WAHA ficam em SQLite (WAL),
+são reenviadas com backoff exponencial e, esgotadas as tentativas, vão
+para a tabela de dead letters
+"""
+
+import asyncio
+import logging
+import os
+import random
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    phone TEXT NOT NULL,
+    message TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    deferrals INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_next_attempt ON outbox (next_attempt_at);
+CREATE INDEX IF NOT EXISTS idx_outbox_phone ON outbox (phone, id);
+CREATE TABLE IF NOT EXISTS dead_letters (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    phone TEXT NOT NULL,
+    message TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    failed_at REAL NOT NULL,
+    last_error TEXT
+);
+"""
+
+# Resultado do `sender`
+DELIVERED = "delivered"
+FAILED = "failed"      # o WAHA falhou ou recusou: conta como tentativa
+DEFERRED = "deferred"  # não tentado (circuito aberto, limitador de taxa): reagenda sem contar tentativa
+
+class DurableOutbox:
+    """📦 Fila de saída persistente com retry e dead letters
+
+    `enqueue` é síncrono e O(1): só acrescenta ao buffer em memória. Uma
+    task grava o buffer em lote (uma transação, um fsync) a cada
+    `flush_interval` ou ao atingir `batch_size`. Todo acesso ao SQLite
+    roda numa única thread dedicada, fora do event loop.
+
+    Itens retirados para reenvio recebem um lease (`next_attempt_at`
+    adiado); se o processo cair no meio do envio eles voltam a ficar
+    elegíveis quando o lease vence. Como o lote é enviado item a item, o
+    lease do lote inteiro é renovado antes de cada envio que poderia
+    passar do vencimento (`send_timeout` = pior caso de um envio).
+
+    A ordem de cada conversa é preservada: só a resposta mais antiga de
+    um chat fica elegível, as seguintes vão atrás dela no mesmo lote, e o
+    primeiro envio que não sai interrompe aquele chat. `has_pending` diz
+    quando uma resposta nova precisa entrar na fila em vez de ir direto
+    (contagem por processo; o SQLite é compartilhado entre workers).
+
+    Envio adiado (DEFERRED) não gasta tentativa, mas tem backoff próprio
+    pelo número de adiamentos; depois de `max_deferrals` vai para as dead
+    letters, para um bloqueio que nunca se resolve não girar para sempre.
+    """
+
+    def __init__(self, path: str, sender: Callable[[str, str], Awaitable[str]],
+                 max_attempts: int = 8, base_delay: float = 5.0, max_delay: float = 900.0,
+                 max_deferrals: int = 50,
+                 flush_interval: float = 0.05, batch_size: int = 500,
+                 poll_interval: float = 1.0, lease: float = 120.0, send_timeout: float = 30.0,
+                 is_available: Optional[Callable[[], bool]] = None):
+        self.path = path
+        self.sender = sender
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_deferrals = max_deferrals
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.send_timeout = send_timeout
+        self.lease = max(lease, 2 * send_timeout)
+        self.is_available = is_available
+        self.buffer: List[Tuple[str, str, float, float]] = []  # (phone, message, created_at, next_attempt_at)
+        self.pending_chats: Dict[str, int] = {}
+        self.flush_event: Optional[asyncio.Event] = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="outbox")
+        self.conn: Optional[sqlite3.Connection] = None
+        self.tasks: List[asyncio.Task] = []
+        self.stats = {
+            "enqueued": 0,
+            "flushes": 0,
+            "delivered": 0,
+            "retried": 0,
+            "deferred": 0,
+            "dead_lettered": 0,
+            "replayed": 0
+        }
+
+    # ---- ciclo de vida ----
+
+    async def start(self):
+        if self.tasks:
+            return
+        self.pending_chats = await self._run(self._open)
+        self.flush_event = asyncio.Event()
+        self.tasks = [
+            asyncio.create_task(self._flush_loop()),
+            asyncio.create_task(self._retry_loop())
+        ]
+        logger.info(f"📦 Fila de saída durável em {self.path}")
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        await self.flush()
+        await self._run(self._close)
+        logger.info("📦 Fila de saída encerrada")
+
+    async def _run(self, func: Callable, *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # FULL: o commit de cada lote só volta depois do fsync do WAL (uma
+        # transação por flush = um fsync por lote); NORMAL perderia lotes já
+        # aceitos se a máquina caísse antes do checkpoint
+        self.conn.execute("PRAGMA synchronous=FULL")
+        self.conn.executescript(_SCHEMA)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(outbox)")}
+        if "deferrals" not in columns:  # banco criado antes da coluna
+            self.conn.execute("ALTER TABLE outbox ADD COLUMN deferrals INTEGER NOT NULL DEFAULT 0")
+        return self._pending_by_chat()
+
+    def _pending_by_chat(self) -> Dict[str, int]:
+        return dict(self.conn.execute("SELECT phone, COUNT(*) FROM outbox GROUP BY phone").fetchall())
+
+    def _close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    # ---- escrita em lote ----
+
+    def has_pending(self, phone: str) -> bool:
+        """Chat tem respostas aguardando na fila (novas devem ir atrás delas)"""
+        return self.pending_chats.get(phone, 0) > 0
+
+    def enqueue(self, phone: str, message: str, delay: Optional[float] = None):
+        """Agendar reenvio de uma resposta (não bloqueia)
+
+        `delay` padrão é `base_delay`; uma resposta que só entra na fila
+        para esperar as anteriores do chat usa 0.
+        """
+        now = time.time()
+        self.buffer.append((phone, message, now, now + (self.base_delay if delay is None else delay)))
+        self.pending_chats[phone] = self.pending_chats.get(phone, 0) + 1
+        self.stats["enqueued"] += 1
+        if self.flush_event is not None and len(self.buffer) >= self.batch_size:
+            self.flush_event.set()
+
+    async def flush(self):
+        """Gravar o buffer pendente em uma única transação"""
+        if not self.buffer or self.conn is None:
+            return
+        batch, self.buffer = self.buffer, []
+        await self._run(self._insert_batch, batch)
+        self.stats["flushes"] += 1
+
+    def _insert_batch(self, batch: List[Tuple[str, str, float, float]]):
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(
+                "INSERT INTO outbox (phone, message, attempts, next_attempt_at, created_at) VALUES (?, ?, 0, ?, ?)",
+                [(phone, message, next_attempt_at, created_at) for phone, message, created_at, next_attempt_at in batch]
+            )
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.flush_event.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.flush_event.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"❌ Erro ao gravar fila de saída: {e}")
+
+    # ---- reenvio ----
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.max_delay, self.base_delay * (2 ** attempts))
+        return delay * random.uniform(0.8, 1.2)
+
+    def _claim_due(self, limit: int) -> List[Tuple[str, List[Tuple[int, str, int, int]]]]:
+        """Chats cuja resposta mais antiga venceu, com as respostas em ordem de chegada"""
+        now = time.time()
+        chats = []
+        claimed = 0
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            heads = self.conn.execute(
+                "SELECT o.phone FROM outbox o WHERE o.next_attempt_at <= ? "
+                "AND o.id = (SELECT MIN(id) FROM outbox WHERE phone = o.phone) "
+                "ORDER BY o.next_attempt_at LIMIT ?", (now, limit)
+            ).fetchall()
+            for (phone,) in heads:
+                if claimed >= limit:
+                    break
+                rows = self.conn.execute(
+                    "SELECT id, message, attempts, deferrals FROM outbox WHERE phone = ? ORDER BY id LIMIT ?",
+                    (phone, limit - claimed)
+                ).fetchall()
+                self.conn.executemany(
+                    "UPDATE outbox SET next_attempt_at = ? WHERE id = ?",
+                    [(now + self.lease, row[0]) for row in rows]
+                )
+                chats.append((phone, rows))
+                claimed += len(rows)
+        return chats
+
+    def _renew_lease(self, row_ids: List[int]) -> float:
+        """Estender o lease dos itens ainda em envio; devolve o novo vencimento"""
+        lease_until = time.time() + self.lease
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.executemany("UPDATE outbox SET next_attempt_at = ? WHERE id = ?",
+                                  [(lease_until, row_id) for row_id in row_ids])
+        return lease_until
+
+    def _dead_letter(self, row_id: int, attempts: int, error: Optional[str], now: float):
+        self.conn.execute(
+            "INSERT INTO dead_letters (phone, message, attempts, created_at, failed_at, last_error) "
+            "SELECT phone, message, ?, created_at, ?, ? FROM outbox WHERE id = ?",
+            (attempts, now, error, row_id)
+        )
+        self.conn.execute("DELETE FROM outbox WHERE id = ?", (row_id,))
+
+    def _record_results(self, delivered: List[int], failed: List[Tuple[int, int, str]],
+                        deferred: List[Tuple[int, int]], expired: List[Tuple[int, int, str]],
+                        held: List[int]):
+        now = time.time()
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.executemany("DELETE FROM outbox WHERE id = ?", [(row_id,) for row_id in delivered])
+            # Recusado localmente: mesmas tentativas, backoff pelos adiamentos
+            self.conn.executemany(
+                "UPDATE outbox SET deferrals = ?, next_attempt_at = ? WHERE id = ?",
+                [(deferrals, now + self._backoff(deferrals), row_id) for row_id, deferrals in deferred]
+            )
+            # Não tentados (atrás de um envio que não saiu): lease devolvido
+            self.conn.executemany("UPDATE outbox SET next_attempt_at = ? WHERE id = ?",
+                                  [(now, row_id) for row_id in held])
+            for row_id, attempts, error in expired:
+                self._dead_letter(row_id, attempts, error, now)
+            for row_id, attempts, error in failed:
+                if attempts >= self.max_attempts:
+                    self._dead_letter(row_id, attempts, error, now)
+                else:
+                    self.conn.execute(
+                        "UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                        (attempts, now + self._backoff(attempts), error, row_id)
+                    )
+
+    async def _retry_loop(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.retry_due()
+            except Exception as e:
+                logger.error(f"❌ Erro no reenvio da fila de saída: {e}")
+
+    def _settle(self, phone: str, count: int = 1):
+        remaining = self.pending_chats.get(phone, 0) - count
+        if remaining > 0:
+            self.pending_chats[phone] = remaining
+        else:
+            self.pending_chats.pop(phone, None)
+
+    async def retry_due(self, limit: int = 100) -> int:
+        """Reenviar itens vencidos, chat a chat e em ordem; devolve quantos foram tentados"""
+        if self.is_available is not None and not self.is_available():
+            return 0
+        lease_until = time.time() + self.lease
+        chats = await self._run(self._claim_due, limit)
+        if not chats:
+            return 0
+        claimed_ids = [row[0] for _, rows in chats for row in rows]
+
+        delivered: List[int] = []
+        failed: List[Tuple[int, int, str]] = []
+        deferred: List[Tuple[int, int]] = []
+        expired: List[Tuple[int, int, str]] = []
+        held: List[int] = []
+        settled: List[str] = []
+        attempted = 0
+        for phone, rows in chats:
+            if self.is_available is not None and not self.is_available():
+                held.extend(row[0] for row in rows)
+                continue
+            for index, (row_id, message, attempts, deferrals) in enumerate(rows):
+                attempted += 1
+                if time.time() + self.send_timeout >= lease_until:
+                    # Nada do lote foi gravado ainda: renovar tudo (inclusive os já
+                    # entregues, que outra retirada reenviaria)
+                    lease_until = await self._run(self._renew_lease, claimed_ids)
+                try:
+                    result = await self.sender(phone, message)
+                    error = None if result == DELIVERED else "envio recusado ou falhou"
+                except Exception as e:
+                    result, error = FAILED, str(e)[:500]
+                if result == DELIVERED:
+                    delivered.append(row_id)
+                    settled.append(phone)
+                    continue
+                if result == DEFERRED:
+                    if deferrals + 1 >= self.max_deferrals:
+                        expired.append((row_id, attempts, f"adiado {deferrals + 1} vezes sem envio"))
+                        settled.append(phone)
+                    else:
+                        deferred.append((row_id, deferrals + 1))
+                else:
+                    failed.append((row_id, attempts + 1, error))
+                    if attempts + 1 >= self.max_attempts:
+                        settled.append(phone)
+                # As seguintes do chat esperam esta sair (ordem da conversa)
+                held.extend(row[0] for row in rows[index + 1:])
+                break
+
+        await self._run(self._record_results, delivered, failed, deferred, expired, held)
+        for phone in settled:
+            self._settle(phone)
+        self.stats["retried"] += attempted
+        self.stats["delivered"] += len(delivered)
+        self.stats["deferred"] += len(deferred)
+        self.stats["dead_lettered"] += len(expired) + sum(1 for _, attempts, _ in failed
+                                                          if attempts >= self.max_attempts)
+        return attempted
+
+    # ---- dead letters ----
+
+    def _list_dead_letters(self, limit: int, offset: int) -> List[Dict[str, Any]]:
+        rows = self.conn.execute(
+            "SELECT id, phone, message, attempts, created_at, failed_at, last_error FROM dead_letters "
+            "ORDER BY id DESC LIMIT ? OFFSET ?", (limit, offset)
+        ).fetchall()
+        keys = ("id", "phone", "message", "attempts", "created_at", "failed_at", "last_error")
+        return [dict(zip(keys, row)) for row in rows]
+
+    async def list_dead_letters(self, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        return await self._run(self._list_dead_letters, limit, offset)
+
+    def _replay(self, dead_letter_id: Optional[int]) -> Tuple[int, Dict[str, int]]:
+        where, params = ("WHERE id = ?", (dead_letter_id,)) if dead_letter_id is not None else ("", ())
+        with self.conn:
+            self.conn.execute("BEGIN")
+            cursor = self.conn.execute(
+                "INSERT INTO outbox (phone, message, attempts, next_attempt_at, created_at) "
+                f"SELECT phone, message, 0, ?, created_at FROM dead_letters {where}",
+                (time.time(),) + params
+            )
+            self.conn.execute(f"DELETE FROM dead_letters {where}", params)
+        return cursor.rowcount, self._pending_by_chat()
+
+    async def replay(self, dead_letter_id: Optional[int] = None) -> int:
+        """Devolver uma dead letter (ou todas, sem id) para a fila de saída"""
+        count, pending_chats = await self._run(self._replay, dead_letter_id)
+        # Linhas ainda no buffer não estão no SQLite
+        for phone, *_ in self.buffer:
+            pending_chats[phone] = pending_chats.get(phone, 0) + 1
+        self.pending_chats = pending_chats
+        self.stats["replayed"] += count
+        return count
+
+    # ---- estatísticas ----
+
+    def _counts(self) -> Tuple[int, int]:
+        pending = self.conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+        dead = self.conn.execute("SELECT COUNT(*) FROM dead_letters").fetchone()[0]
+        return pending, dead
+
+    async def get_stats(self) -> Dict[str, Any]:
+        pending, dead = await self._run(self._counts) if self.conn is not None else (0, 0)
+        return {**self.stats, "buffered": len(self.buffer), "pending": pending, "dead_letters": dead,
+                "pending_chats": len(self.pending_chats)}
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Proteção de Envio - Claudia Cobranças
+Token bucket (por sessão e por destinatário) e circuit breaker para o WAHA
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from .cache import LRUTTLCache
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """🪣 Token bucket clássico: `rate` fichas/s, no máximo `burst` acumuladas"""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """Segundos até haver uma ficha (0 se já houver)"""
+        self._refill(time.monotonic())
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self._refill(time.monotonic())
+        self.tokens -= 1
+
+class SendRateLimiter:
+    """🚦 Limite de envio por sessão WAHA e por destinatário
+
+    Uma mensagem só sai quando os dois buckets têm ficha. Se a espera
+    necessária couber em `max_wait` o envio aguarda; senão é recusado e
+    contado em `rejected`. Buckets de destinatários ficam num LRU+TTL para
+    não crescer com o número de chats.
+    """
+
+    def __init__(self, session_rate: float = 5.0, session_burst: float = 10.0,
+                 recipient_rate: float = 0.5, recipient_burst: float = 3.0,
+                 max_wait: float = 2.0, max_recipients: int = 10000):
+        self.session_rate = session_rate
+        self.session_burst = session_burst
+        self.recipient_rate = recipient_rate
+        self.recipient_burst = recipient_burst
+        self.max_wait = max_wait
+        self.sessions: Dict[str, TokenBucket] = {}
+        # Bucket parado por burst/rate segundos já estaria cheio de novo
+        self.recipients = LRUTTLCache(max_size=max_recipients, ttl=recipient_burst / recipient_rate)
+        self.stats = {"allowed": 0, "delayed": 0, "rejected_session": 0, "rejected_recipient": 0}
+
+    def _buckets(self, session: str, recipient: str):
+        session_bucket = self.sessions.get(session)
+        if session_bucket is None:
+            session_bucket = self.sessions[session] = TokenBucket(self.session_rate, self.session_burst)
+        recipient_bucket = self.recipients.get(recipient)
+        if recipient_bucket is None:
+            recipient_bucket = TokenBucket(self.recipient_rate, self.recipient_burst)
+        self.recipients.set(recipient, recipient_bucket)
+        return session_bucket, recipient_bucket
+
+    async def acquire(self, session: str, recipient: str) -> bool:
+        """Reservar uma ficha nos dois buckets; False se recusado"""
+        session_bucket, recipient_bucket = self._buckets(session, recipient)
+
+        recipient_wait = recipient_bucket.wait_time()
+        if recipient_wait > self.max_wait:
+            self.stats["rejected_recipient"] += 1
+            return False
+        session_wait = session_bucket.wait_time()
+        if session_wait > self.max_wait:
+            self.stats["rejected_session"] += 1
+            return False
+
+        wait = max(recipient_wait, session_wait)
+        # Consumir antes de dormir para que envios concorrentes enxerguem a reserva
+        session_bucket.consume()
+        recipient_bucket.consume()
+        if wait > 0:
+            self.stats["delayed"] += 1
+            await asyncio.sleep(wait)
+        self.stats["allowed"] += 1
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "session_rate": self.session_rate,
+            "recipient_rate": self.recipient_rate,
+            "tracked_recipients": len(self.recipients)
+        }
+
+class CircuitBreaker:
+    """⚡ Circuit breaker: closed → open → half_open → closed
+
+    Abre após `failure_threshold` falhas seguidas e passa a recusar na
+    hora. Depois de `reset_timeout` segundos deixa passar até
+    `half_open_max_calls` chamadas de teste: sucesso fecha o circuito,
+    falha reabre e reinicia a contagem.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, half_open_max_calls: int = 1):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.half_open_calls = 0
+        self.stats = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    def is_open(self) -> bool:
+        """Circuito aberto e ainda dentro do `reset_timeout` (sem efeitos colaterais)"""
+        return self.state == self.OPEN and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def allow(self) -> bool:
+        """Verificar se uma chamada pode seguir"""
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.stats["rejected"] += 1
+                return False
+            self.state = self.HALF_OPEN
+            self.half_open_calls = 0
+            logger.info("⚡ Circuito WAHA meio-aberto, testando")
+
+        if self.state == self.HALF_OPEN:
+            if self.half_open_calls >= self.half_open_max_calls:
+                self.stats["rejected"] += 1
+                return False
+            self.half_open_calls += 1
+
+        return True
+
+    def release(self):
+        """Devolver a vaga de `allow()` quando a chamada acabou não sendo feita"""
+        if self.state == self.HALF_OPEN and self.half_open_calls > 0:
+            self.half_open_calls -= 1
+
+    def record_success(self):
+        self.stats["successes"] += 1
+        self.failures = 0
+        if self.state != self.CLOSED:
+            logger.info("⚡ Circuito WAHA fechado")
+        self.state = self.CLOSED
+
+    def record_failure(self):
+        self.stats["failures"] += 1
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.stats["opened"] += 1
+                logger.warning(f"⚡ Circuito WAHA aberto por {self.reset_timeout}s")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def get_stats(self) -> Dict[str, Any]:
+        retry_in = None
+        if self.state == self.OPEN:
+            retry_in = round(max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at)), 1)
+        return {
+            **self.stats,
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "retry_in": retry_in
+        }
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache de Respostas - Claudia Cobranças
+Memoização do resultado do engine para frases repetidas
+"""
+
+import logging
+from typing import Any, Dict, Hashable, Optional
+
+from .cache import LRUTTLCache
+
+logger = logging.getLogger(__name__)
+
+class ResponseCache:
+    """⚡ LRU de resultados do engine por (mensagem normalizada, contexto)
+
+    Só entram na chave os campos de contexto que mudam a resposta. O cache
+    guarda a versão das regras com que foi preenchido e se esvazia sozinho
+    quando o engine passa a usar outro conjunto de regras.
+    """
+
+    def __init__(self, max_size: int = 5000, ttl: Optional[float] = None):
+        self.cache = LRUTTLCache(max_size=max_size, ttl=ttl)
+        self.rules_version: Optional[str] = None
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(normalized: str, user_context: Optional[Dict] = None) -> Hashable:
+        if not user_context:
+            return (normalized, None, False)
+        return (normalized, user_context.get("last_intent"), bool(user_context.get("pending_actions")))
+
+    def _check_version(self, rules_version: str):
+        if rules_version != self.rules_version:
+            if self.rules_version is not None:
+                self.invalidations += 1
+                logger.info(f"⚡ Regras mudaram ({self.rules_version} → {rules_version}), cache de respostas limpo")
+            self.cache.clear()
+            self.rules_version = rules_version
+
+    def get(self, key: Hashable, rules_version: str) -> Optional[Dict[str, Any]]:
+        self._check_version(rules_version)
+        result = self.cache.get(key)
+        if result is None:
+            return None
+        # Cópia rasa das partes mutáveis: quem chama pode alterar o dict
+        return {**result, "actions": list(result["actions"]), "matches": [dict(m) for m in result["matches"]]}
+
+    def set(self, key: Hashable, result: Dict[str, Any], rules_version: str):
+        self._check_version(rules_version)
+        self.cache.set(key, result)
+
+    def clear(self):
+        self.cache.clear()
+
+    def resize(self, max_size: int):
+        self.cache.resize(max_size)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.cache.get_stats()
+        lookups = stats["hits"] + stats["misses"]
+        return {
+            "hits": stats["hits"],
+            "misses": stats["misses"],
+            "evictions": stats["evictions"] + stats["expired"],
+            "hit_ratio": round(stats["hits"] / lookups, 4) if lookups else 0.0,
+            "size": stats["size"],
+            "max_size": stats["max_size"],
+            "invalidations": self.invalidations,
+            "rules_version": self.rules_version
+        }
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Armazenamento de Autenticação - Claudia Cobranças
+Solicitações de login pendentes e sessões ativas, em memória (padrão) ou
+em SQLite compartilhado entre workers
+"""
+
+import abc
+import heapq
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class SessionBackend(abc.ABC):
+    """🔐 Interface dos backends de autenticação
+
+    Toda entrada tem um `expires_at` absoluto; leituras nunca devolvem
+    entradas vencidas, e `purge_expired` remove as vencidas em lote.
+    """
+
+    name = "base"
+    blocking = False  # True quando as operações fazem I/O (rodar fora do event loop)
+
+    @abc.abstractmethod
+    def add_pending(self, request_id: str, data: Dict[str, Any], expires_at: float):
+        ...
+
+    @abc.abstractmethod
+    def get_pending(self, request_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abc.abstractmethod
+    def pop_pending(self, request_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abc.abstractmethod
+    def count_pending(self) -> int:
+        ...
+
+    @abc.abstractmethod
+    def approve(self, request_id: str, session: Dict[str, Any], expires_at: float) -> Optional[Dict[str, Any]]:
+        """Mover a solicitação para sessões ativas (atômico); devolve a solicitação"""
+        ...
+
+    @abc.abstractmethod
+    def get_session(self, token: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abc.abstractmethod
+    def remove_session(self, token: str):
+        ...
+
+    @abc.abstractmethod
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        ...
+
+    @abc.abstractmethod
+    def get_stats(self) -> Dict[str, Any]:
+        ...
+
+    def close(self):
+        pass
+
+class MemorySessionBackend(SessionBackend):
+    """Backend padrão: dicts no próprio processo (um worker só)
+
+    Os vencimentos ficam num min-heap de (expira_em, tipo, chave), então a
+    limpeza só toca o que já venceu: O(k log n) para k entradas vencidas.
+    Remoções antecipadas (aprovar, rejeitar) deixam a entrada do heap para
+    trás; ela é descartada quando chega ao topo, e o heap é recompactado se
+    as sobras passarem do dobro das entradas vivas.
+    """
+
+    name = "memory"
+
+    def __init__(self):
+        self.pending: Dict[str, tuple] = {}   # {request_id: (dados, expira_em)}
+        self.sessions: Dict[str, tuple] = {}  # {token: (dados, expira_em)}
+        self.heap: List[Tuple[float, str, str]] = []
+        self.expired = 0
+
+    def _stores(self) -> Dict[str, Dict[str, tuple]]:
+        return {"pending": self.pending, "session": self.sessions}
+
+    def _schedule(self, kind: str, key: str, expires_at: float):
+        heapq.heappush(self.heap, (expires_at, kind, key))
+        if len(self.heap) > 2 * (len(self.pending) + len(self.sessions)) + 64:
+            self.heap = [(expires_at, kind, key)
+                         for kind, store in self._stores().items()
+                         for key, (_, expires_at) in store.items()]
+            heapq.heapify(self.heap)
+
+    def _live(self, store: Dict[str, tuple], key: str) -> Optional[Dict[str, Any]]:
+        item = store.get(key)
+        if item is None:
+            return None
+        if item[1] <= time.time():
+            del store[key]
+            self.expired += 1
+            return None
+        return item[0]
+
+    def add_pending(self, request_id, data, expires_at):
+        self.pending[request_id] = (data, expires_at)
+        self._schedule("pending", request_id, expires_at)
+
+    def get_pending(self, request_id):
+        return self._live(self.pending, request_id)
+
+    def pop_pending(self, request_id):
+        data = self._live(self.pending, request_id)
+        if data is not None:
+            del self.pending[request_id]
+        return data
+
+    def count_pending(self):
+        return len(self.pending)
+
+    def approve(self, request_id, session, expires_at):
+        data = self.pop_pending(request_id)
+        if data is not None:
+            self.sessions[request_id] = (session, expires_at)
+            self._schedule("session", request_id, expires_at)
+        return data
+
+    def get_session(self, token):
+        return self._live(self.sessions, token)
+
+    def remove_session(self, token):
+        self.sessions.pop(token, None)
+
+    def purge_expired(self, now=None):
+        now = now if now is not None else time.time()
+        stores = self._stores()
+        removed = 0
+        while self.heap and self.heap[0][0] <= now:
+            expires_at, kind, key = heapq.heappop(self.heap)
+            store = stores[kind]
+            item = store.get(key)
+            # Entrada obsoleta: chave já removida ou reagendada com outro prazo
+            if item is not None and item[1] == expires_at:
+                del store[key]
+                removed += 1
+        self.expired += removed
+        return removed
+
+    def get_stats(self):
+        return {
+            "backend": self.name,
+            "pending": len(self.pending),
+            "sessions": len(self.sessions),
+            "expired": self.expired,
+            "heap_size": len(self.heap)
+        }
+
+class SQLiteSessionBackend(SessionBackend):
+    """Backend compartilhado: SQLite (WAL) visível a todos os workers
+
+    Chave primária dá busca O(1) por id/token e o índice em `expires_at`
+    deixa a limpeza de vencidos proporcional ao que venceu, não ao total.
+    """
+
+    name = "sqlite"
+    blocking = True
+
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS pending_auth (
+        request_id TEXT PRIMARY KEY,
+        data TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_pending_auth_expires ON pending_auth (expires_at);
+    CREATE TABLE IF NOT EXISTS sessions (
+        token TEXT PRIMARY KEY,
+        data TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at);
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self._SCHEMA)
+
+    def _fetch(self, table: str, key_column: str, key: str) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute(
+            f"SELECT data FROM {table} WHERE {key_column} = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def add_pending(self, request_id, data, expires_at):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pending_auth (request_id, data, expires_at) VALUES (?, ?, ?)",
+                (request_id, json.dumps(data), expires_at)
+            )
+
+    def get_pending(self, request_id):
+        with self.lock:
+            return self._fetch("pending_auth", "request_id", request_id)
+
+    def pop_pending(self, request_id):
+        with self.lock, self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            data = self._fetch("pending_auth", "request_id", request_id)
+            self.conn.execute("DELETE FROM pending_auth WHERE request_id = ?", (request_id,))
+            return data
+
+    def count_pending(self):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM pending_auth WHERE expires_at > ?", (time.time(),)
+            ).fetchone()[0]
+
+    def approve(self, request_id, session, expires_at):
+        # Uma transação: dois workers aprovando juntos não criam duas sessões
+        with self.lock, self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            data = self._fetch("pending_auth", "request_id", request_id)
+            if data is None:
+                return None
+            self.conn.execute("DELETE FROM pending_auth WHERE request_id = ?", (request_id,))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sessions (token, data, expires_at) VALUES (?, ?, ?)",
+                (request_id, json.dumps(session), expires_at)
+            )
+            return data
+
+    def get_session(self, token):
+        with self.lock:
+            return self._fetch("sessions", "token", token)
+
+    def remove_session(self, token):
+        with self.lock:
+            self.conn.execute("DELETE FROM sessions WHERE token = ?", (token,))
+
+    def purge_expired(self, now=None):
+        now = now if now is not None else time.time()
+        with self.lock, self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            removed = self.conn.execute("DELETE FROM pending_auth WHERE expires_at <= ?", (now,)).rowcount
+            removed += self.conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,)).rowcount
+            return removed
+
+    def get_stats(self):
+        with self.lock:
+            now = time.time()
+            pending = self.conn.execute("SELECT COUNT(*) FROM pending_auth WHERE expires_at > ?", (now,)).fetchone()[0]
+            sessions = self.conn.execute("SELECT COUNT(*) FROM sessions WHERE expires_at > ?", (now,)).fetchone()[0]
+        return {"backend": self.name, "pending": pending, "sessions": sessions}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+def create_session_backend(kind: str = "memory", path: Optional[str] = None) -> SessionBackend:
+    """Criar o backend configurado ("memory" ou "sqlite")"""
+    if kind == "sqlite":
+        logger.info(f"🔐 Sessões em SQLite compartilhado: {path}")
+        return SQLiteSessionBackend(path or "temp/sessions.db")
+    if kind != "memory":
+        logger.warning(f"⚠️ Backend de sessões desconhecido '{kind}', usando memória")
+    return MemorySessionBackend()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Assets Estáticos - Claudia Cobranças
+URLs com hash do conteúdo (cache imutável no navegador/proxy) e
+validação por ETag para o que precisa revalidar
+"""
+
+import hashlib
+import mimetypes
+import os
+from typing import Dict, Iterable, Optional, Tuple
+
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+
+from .compression import choose_encoding, compress, is_compressible
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+def content_etag(content: bytes) -> str:
+    return '"' + hashlib.sha256(content).hexdigest()[:16] + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match bate com o ETag (aceita lista e `*`; comparação fraca, `W/` ignorado)"""
+    if not if_none_match:
+        return False
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or any((tag[2:] if tag.startswith("W/") else tag) == opaque for tag in tags)
+
+class AssetManifest:
+    """🔖 Hash do conteúdo de cada arquivo estático, calculado uma vez
+
+    `url("style.css")` devolve `/static/style.<hash>.css`; arquivo alterado
+    gera URL nova, então a antiga pode ser cacheada para sempre. Arquivos
+    em `exclude` (o `sw.js`, que o navegador atualiza pelo próprio ciclo
+    do service worker) mantêm a URL fixa.
+
+    Com `encodings`, arquivos de texto acima de `min_size` também são
+    comprimidos aqui, uma única vez, e servidos prontos a cada requisição.
+    """
+
+    def __init__(self, directory: str, prefix: str = "/static", exclude: Iterable[str] = ("sw.js",),
+                 encodings: Iterable[str] = (), min_size: int = 1024):
+        self.directory = directory
+        self.prefix = prefix.rstrip("/")
+        self.exclude = set(exclude)
+        self.encodings = tuple(encodings)
+        self.min_size = min_size
+        self.hashes: Dict[str, str] = {}        # nome -> hash
+        self.fingerprinted: Dict[str, str] = {}  # nome com hash -> nome
+        self.variants: Dict[str, Dict[str, Tuple[bytes, str]]] = {}  # nome -> {encoding: (bytes, etag)}
+        self.refresh()
+
+    @staticmethod
+    def fingerprint(name: str, digest: str) -> str:
+        root, ext = os.path.splitext(name)
+        return f"{root}.{digest}{ext}"
+
+    def refresh(self):
+        """Recalcular os hashes e as versões comprimidas (startup)"""
+        self.hashes.clear()
+        self.fingerprinted.clear()
+        self.variants.clear()
+        for folder, _, files in os.walk(self.directory):
+            for filename in files:
+                full_path = os.path.join(folder, filename)
+                name = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+                with open(full_path, "rb") as f:
+                    content = f.read()
+                self._precompress(name, content)
+                if name in self.exclude:
+                    continue
+                digest = hashlib.sha256(content).hexdigest()[:12]
+                self.hashes[name] = digest
+                self.fingerprinted[self.fingerprint(name, digest)] = name
+
+    def _precompress(self, name: str, content: bytes):
+        content_type = mimetypes.guess_type(name)[0] or ""
+        if len(content) < self.min_size or not is_compressible(content_type):
+            return
+        variants = {}
+        for encoding in self.encodings:
+            # Qualidade máxima: o custo é pago uma vez, no startup
+            encoded = compress(content, encoding, gzip_level=9, brotli_quality=11)
+            if len(encoded) < len(content):
+                variants[encoding] = (encoded, content_etag(encoded))
+        if variants:
+            self.variants[name] = variants
+
+    def url(self, name: str) -> str:
+        digest = self.hashes.get(name)
+        return f"{self.prefix}/{self.fingerprint(name, digest) if digest else name}"
+
+    def resolve(self, path: str) -> Tuple[str, bool]:
+        """Caminho pedido -> (arquivo real, pode ser imutável?)"""
+        name = path.replace(os.sep, "/")
+        original = self.fingerprinted.get(name)
+        if original is not None:
+            return original, True
+        return path, False
+
+class FingerprintedStaticFiles(StaticFiles):
+    """StaticFiles que entende as URLs com hash do `AssetManifest`
+
+    URL com hash atual → cache imutável de um ano. URL sem hash (ou com
+    hash antigo, que cai no 404) → `no-cache`: o navegador revalida com
+    ETag/Last-Modified e recebe 304 quando nada mudou. Quando o cliente
+    aceita, a versão pré-comprimida do manifesto é enviada direto.
+    """
+
+    def __init__(self, *args, manifest: AssetManifest, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.manifest = manifest
+
+    async def get_response(self, path: str, scope: Scope):
+        real_path, immutable = self.manifest.resolve(path)
+        cache_control = IMMUTABLE_CACHE if immutable else REVALIDATE_CACHE
+        variants = self.manifest.variants.get(real_path.replace(os.sep, "/"))
+        if variants and scope["method"] in ("GET", "HEAD"):
+            request_headers = Headers(scope=scope)
+            encoding = choose_encoding(request_headers.get("accept-encoding"), variants)
+            if encoding is not None:
+                content, etag = variants[encoding]
+                return self.encoded_response(real_path, encoding, content, etag, request_headers,
+                                             cache_control, scope["method"])
+
+        response = await super().get_response(real_path, scope)
+        response.headers["Cache-Control"] = cache_control
+        if variants:
+            response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+    @staticmethod
+    def encoded_response(path: str, encoding: str, content: bytes, etag: str, request_headers: Headers,
+                         cache_control: str, method: str) -> Response:
+        headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding",
+                   "Content-Encoding": encoding}
+        if etag_matches(request_headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        response = Response(b"" if method == "HEAD" else content, media_type=media_type, headers=headers)
+        if method == "HEAD":
+            response.headers["Content-Length"] = str(len(content))
+        return response
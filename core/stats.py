@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Estatísticas Compartilhadas - Claudia Cobranças
+Cada worker uvicorn publica seus contadores num SQLite local e a leitura
+soma todos os workers
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS worker_stats (
+    worker_id TEXT PRIMARY KEY,
+    counters TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_worker_stats_updated ON worker_stats (updated_at);
+"""
+
+class SharedStats:
+    """📊 Agregação de contadores entre processos
+
+    O caminho quente continua incrementando um dict local, sem lock. Uma
+    task publica uma cópia desse dict a cada `interval` segundos (um
+    UPSERT por worker, fora do event loop). Na leitura, as linhas dos
+    outros workers são somadas aos contadores locais ao vivo; o resultado
+    fica em cache por `interval` para que o dashboard não vire carga.
+    """
+
+    def __init__(self, path: str, counters: Dict[str, Any], interval: float = 1.0,
+                 retention: float = 86400.0, worker_id: Optional[str] = None):
+        self.path = path
+        self.counters = counters
+        self.interval = interval
+        self.retention = retention
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.started_at = time.time()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stats")
+        self.conn: Optional[sqlite3.Connection] = None
+        self.task: Optional[asyncio.Task] = None
+        self.cached: Optional[Tuple[float, Dict[str, Any]]] = None
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self._open)
+        await self.publish()
+        self.task = asyncio.create_task(self._publish_loop())
+        logger.info(f"📊 Estatísticas compartilhadas em {self.path} (worker {self.worker_id})")
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        if self.conn is not None:
+            await self.publish()
+            await asyncio.get_running_loop().run_in_executor(self.executor, self.conn.close)
+            self.conn = None
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+
+    def _write(self, payload: str, now: float):
+        self.conn.execute(
+            "INSERT INTO worker_stats (worker_id, counters, started_at, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(worker_id) DO UPDATE SET counters = excluded.counters, updated_at = excluded.updated_at",
+            (self.worker_id, payload, self.started_at, now)
+        )
+
+    async def publish(self):
+        """Publicar os contadores locais deste worker"""
+        payload = json.dumps(self.counters)
+        await asyncio.get_running_loop().run_in_executor(self.executor, self._write, payload, time.time())
+
+    async def _publish_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.publish()
+            except Exception as e:
+                logger.error(f"❌ Erro ao publicar estatísticas: {e}")
+
+    def _read_others(self) -> List[Tuple[str, float]]:
+        cutoff = time.time() - self.retention
+        return self.conn.execute(
+            "SELECT counters, updated_at FROM worker_stats WHERE updated_at >= ? AND worker_id != ?",
+            (cutoff, self.worker_id)
+        ).fetchall()
+
+    async def get_totals(self) -> Dict[str, Any]:
+        """Totais do cluster (workers vivos e encerrados dentro da retenção)"""
+        now = time.time()
+        if self.cached is not None and now - self.cached[0] < self.interval:
+            return self.cached[1]
+
+        rows = []
+        if self.conn is not None:
+            rows = await asyncio.get_running_loop().run_in_executor(self.executor, self._read_others)
+
+        totals: Dict[str, Any] = dict(self.counters)
+        live = 1
+        for counters, updated_at in rows:
+            for name, value in json.loads(counters).items():
+                if isinstance(value, (int, float)):
+                    totals[name] = totals.get(name, 0) + value
+            if now - updated_at <= self.interval * 3:
+                live += 1
+
+        result = {"totals": totals, "workers": len(rows) + 1, "live_workers": live, "worker_id": self.worker_id}
+        self.cached = (now, result)
+        return result
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cliente WAHA - Claudia Cobranças
+Cliente HTTP compartilhado (pool de conexões) e roteamento dos endpoints
+de envio do WAHA
+"""
+
+import logging
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Any, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+class WahaClient:
+    """📡 Cliente HTTP de longa duração para o WAHA
+
+    Um único httpx.AsyncClient por processo, criado no startup e fechado
+    no shutdown, para que cada resposta reaproveite conexões keep-alive em
+    vez de pagar um handshake TCP+TLS novo a cada tentativa.
+    """
+
+    def __init__(self, settings: Dict[str, Any]):
+        self.settings = settings
+        self.client: Optional[httpx.AsyncClient] = None
+        self.closed = False  # close() chamado: post() não reabre o cliente sozinho
+        self.http2 = False
+        self.stats = {
+            "requests": 0,
+            "errors": 0,
+            "new_connections": 0,
+            "reused_connections": 0
+        }
+
+    async def start(self):
+        """Criar o cliente compartilhado"""
+        if self.client is not None:
+            return
+
+        self.closed = False
+        self.http2 = self.settings.get("http2", False)
+        if self.http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("⚠️ HTTP/2 solicitado mas pacote 'h2' não instalado - usando HTTP/1.1")
+                self.http2 = False
+
+        limits = httpx.Limits(
+            max_connections=self.settings["max_connections"],
+            max_keepalive_connections=self.settings["max_keepalive_connections"],
+            keepalive_expiry=self.settings["keepalive_expiry"]
+        )
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(self.settings["timeout"], connect=self.settings["connect_timeout"]),
+            limits=limits,
+            http2=self.http2,
+            headers={"Content-Type": "application/json"}
+        )
+        logger.info(f"📡 Cliente WAHA iniciado (pool={self.settings['max_connections']}, http2={self.http2})")
+
+    async def close(self):
+        """Fechar o cliente e suas conexões"""
+        self.closed = True
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+            logger.info("📡 Cliente WAHA encerrado")
+
+    async def post(self, url: str, payload: Dict[str, Any], **kwargs) -> httpx.Response:
+        """POST JSON usando o pool compartilhado"""
+        if self.client is None:
+            if self.closed:
+                # Envio atrasado depois do shutdown: não abrir um pool que ninguém fecha
+                raise RuntimeError("Cliente WAHA encerrado")
+            await self.start()
+
+        opened = False
+
+        async def trace(event_name: str, info: Dict[str, Any]):
+            # connect_tcp só acontece quando o pool precisou abrir conexão nova
+            nonlocal opened
+            if event_name == "connection.connect_tcp.complete":
+                opened = True
+
+        self.stats["requests"] += 1
+        try:
+            response = await self.client.post(url, json=payload, extensions={"trace": trace}, **kwargs)
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            if opened:
+                self.stats["new_connections"] += 1
+
+        if not opened:
+            self.stats["reused_connections"] += 1
+        return response
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Estatísticas do pool (reuso x conexões novas)"""
+        completed = self.stats["new_connections"] + self.stats["reused_connections"]
+        return {
+            **self.stats,
+            "reuse_ratio": round(self.stats["reused_connections"] / completed, 3) if completed else 0.0,
+            "http2": self.http2,
+            "max_connections": self.settings["max_connections"],
+            "max_keepalive_connections": self.settings["max_keepalive_connections"]
+        }
+
+@dataclass
+class WahaRoute:
+    """Formato de endpoint/payload aceito por alguma versão do WAHA"""
+    name: str
+    path: str
+    build_payload: Callable[[str, str], Dict[str, Any]]
+
+# Formatos conhecidos, na ordem histórica de tentativa
+WAHA_ROUTES: List[WahaRoute] = [
+    # Tentativa 1: Endpoint padrão com chatId
+    WahaRoute("sessions_messages_text", "/api/sessions/default/messages/text",
+              lambda phone, text: {"chatId": phone, "text": text}),
+    # Tentativa 2: Endpoint alternativo com to
+    WahaRoute("send_text_session", "/api/sendText",
+              lambda phone, text: {"session": "default", "to": phone, "text": text}),
+    # Tentativa 3: Formato Baileys
+    WahaRoute("sessions_send_text", "/api/sessions/default/send/text",
+              lambda phone, text: {"chatId": phone, "text": text}),
+    # Tentativa 4: Sem session no payload
+    WahaRoute("send_text", "/api/sendText",
+              lambda phone, text: {"to": phone, "text": text}),
+    # Tentativa 5: Formato simplificado
+    WahaRoute("messages_text", "/api/messages/text",
+              lambda phone, text: {"chatId": phone, "text": text}),
+]
+
+def waha_base_url(waha_url: str) -> str:
+    """Montar URL base do WAHA (WAHA_URL pode vir com ou sem esquema)"""
+    waha_url = waha_url.strip().rstrip("/")
+    if waha_url.startswith(("http://", "https://")):
+        return waha_url
+    return f"https://{waha_url}"
+
+class WahaRouter:
+    """🧭 Memória de qual formato de endpoint funciona em cada host WAHA
+
+    O último formato que funcionou é tentado primeiro. Formatos que falham
+    `demote_after` vezes seguidas (ou respondem 404) vão para o fim da fila
+    por `demote_ttl` segundos; depois disso voltam à ordem normal.
+    """
+
+    def __init__(self, routes: Optional[List[WahaRoute]] = None,
+                 demote_after: int = 2, demote_ttl: float = 300.0):
+        self.routes = routes if routes is not None else WAHA_ROUTES
+        self.demote_after = demote_after
+        self.demote_ttl = demote_ttl
+        self.preferred: Dict[str, str] = {}               # {host: route_name}
+        self.failures: Dict[str, Dict[str, int]] = {}     # {host: {route_name: falhas seguidas}}
+        self.demoted: Dict[str, Dict[str, float]] = {}    # {host: {route_name: expira_em}}
+        self.stats = {"first_try_hits": 0, "fallbacks": 0, "demotions": 0, "probes": 0}
+
+    def order(self, host: str) -> List[WahaRoute]:
+        """Formatos na ordem em que devem ser tentados para o host"""
+        now = time.monotonic()
+        demoted = self.demoted.get(host, {})
+        for name in [name for name, until in demoted.items() if until <= now]:
+            del demoted[name]
+
+        preferred = self.preferred.get(host)
+        active = [route for route in self.routes if route.name not in demoted]
+        active.sort(key=lambda route: route.name != preferred)
+        # Rebaixados continuam no fim: melhor tentar do que perder a mensagem
+        return active + [route for route in self.routes if route.name in demoted]
+
+    def record_success(self, host: str, route: WahaRoute, attempt: int = 1):
+        if attempt == 1:
+            self.stats["first_try_hits"] += 1
+        else:
+            self.stats["fallbacks"] += 1
+        if self.preferred.get(host) != route.name:
+            logger.info(f"🧭 WAHA {host}: formato preferido agora é '{route.name}'")
+        self.preferred[host] = route.name
+        self.failures.setdefault(host, {}).pop(route.name, None)
+        self.demoted.get(host, {}).pop(route.name, None)
+
+    def record_failure(self, host: str, route: WahaRoute, status_code: Optional[int] = None):
+        failures = self.failures.setdefault(host, {})
+        failures[route.name] = failures.get(route.name, 0) + 1
+
+        # 404 = rota inexistente nesta versão do WAHA, rebaixar na hora
+        if status_code == 404 or failures[route.name] >= self.demote_after:
+            self.demoted.setdefault(host, {})[route.name] = time.monotonic() + self.demote_ttl
+            failures[route.name] = 0
+            self.stats["demotions"] += 1
+            if self.preferred.get(host) == route.name:
+                del self.preferred[host]
+
+    async def probe(self, client: "WahaClient", host: str) -> Optional[WahaRoute]:
+        """Descobrir o formato certo antes da primeira mensagem de cliente
+
+        Envia um POST vazio para cada rota: 404 indica rota inexistente;
+        qualquer outra resposta abaixo de 500 (400/422 de validação, por
+        exemplo) indica que a rota existe. Nenhuma mensagem é entregue.
+        """
+        self.stats["probes"] += 1
+        for route in self.routes:
+            try:
+                response = await client.post(host + route.path, {})
+            except Exception as e:
+                logger.warning(f"⚠️ Sonda WAHA falhou em {route.path}: {e}")
+                continue
+
+            if response.status_code == 404:
+                self.record_failure(host, route, 404)
+            elif response.status_code < 500:
+                self.preferred[host] = route.name
+                logger.info(f"🧭 Sonda WAHA escolheu '{route.name}' para {host}")
+                return route
+
+        logger.warning(f"⚠️ Sonda WAHA não encontrou formato válido para {host}")
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            **self.stats,
+            "preferred": dict(self.preferred),
+            "demoted": {
+                host: {name: round(until - now, 1) for name, until in routes.items() if until > now}
+                for host, routes in self.demoted.items()
+            }
+        }
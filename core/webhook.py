@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Decodificação de Webhooks - Claudia Cobranças
+Modelos tipados dos eventos `message` e `engine.event` do WAHA, leitura
+do corpo com limite de tamanho e JSON rápido (orjson, se instalado)
+"""
+
+import json
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from .dedup import message_dedup_key
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+    _loads = orjson.loads
+    JSON_BACKEND = "orjson"
+except ImportError:
+    _loads = json.loads
+    JSON_BACKEND = "json"
+
+class WebhookDecodeError(ValueError):
+    """Corpo do webhook não é um objeto JSON válido"""
+
+class WebhookTooLarge(ValueError):
+    """Corpo do webhook acima do limite configurado"""
+
+@dataclass
+class WahaMessage:
+    """💬 Campos da mensagem do WAHA que o bot usa
+
+    Todo o resto (`_data`, mídia em base64, citações, vCards) fica no dict
+    decodificado e nunca é copiado, percorrido ou logado.
+    """
+    chat_id: str
+    body: str
+    dedup_key: Optional[str]
+    timestamp: Optional[int] = None
+    from_me: bool = False
+    has_media: bool = False
+
+    @classmethod
+    def from_payload(cls, data: Any) -> Optional["WahaMessage"]:
+        if not isinstance(data, dict):
+            return None
+        body = data.get("body")
+        return cls(
+            chat_id=data.get("from") or "",
+            body=body if isinstance(body, str) else "",
+            dedup_key=message_dedup_key(data),
+            timestamp=data.get("timestamp"),
+            from_me=bool(data.get("fromMe")),
+            has_media=bool(data.get("hasMedia"))
+        )
+
+@dataclass
+class WebhookEvent:
+    """📱 Evento recebido; `message` é None quando não traz mensagem de cliente"""
+    event: str
+    session: Optional[str]
+    message: Optional[WahaMessage]
+
+def _extract_message(data: Dict[str, Any]) -> Optional[WahaMessage]:
+    event = data.get("event")
+    payload = data.get("payload")
+    if not isinstance(payload, dict):
+        return None
+
+    if event == "message":
+        return WahaMessage.from_payload(payload)
+
+    # Evento de mensagens não lidas: a mensagem vem em data.lastMessage
+    if event == "engine.event" and payload.get("event") == "unread_count":
+        inner = payload.get("data")
+        if isinstance(inner, dict):
+            return WahaMessage.from_payload(inner.get("lastMessage"))
+    return None
+
+def decode_webhook(body: bytes) -> WebhookEvent:
+    """Decodificar o corpo bruto do webhook em um `WebhookEvent`"""
+    try:
+        data = _loads(body)
+    except ValueError as e:  # orjson.JSONDecodeError e json.JSONDecodeError herdam de ValueError
+        raise WebhookDecodeError(f"JSON inválido: {e}") from e
+    if not isinstance(data, dict):
+        raise WebhookDecodeError("Webhook deve ser um objeto JSON")
+
+    event = data.get("event")
+    session = data.get("session")
+    return WebhookEvent(
+        event=event if isinstance(event, str) else "",
+        session=session if isinstance(session, str) else None,
+        message=_extract_message(data)
+    )
+
+async def read_body(request, max_size: int) -> bytes:
+    """Ler o corpo da requisição sem passar de `max_size` bytes
+
+    Recusa pelo Content-Length antes de ler qualquer coisa e, para corpos
+    sem tamanho declarado (chunked), interrompe a leitura ao estourar.
+    """
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_size:
+        raise WebhookTooLarge(f"{declared} bytes (limite {max_size})")
+
+    chunks = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > max_size:
+            raise WebhookTooLarge(f"mais de {max_size} bytes")
+        chunks.append(chunk)
+    return b"".join(chunks)
@@ -3,13 +3,18 @@ class ClaudiaCobrancas {
     constructor() {
         this.messages = [];
         this.logs = [];
+        this.logCursor = null;     // próxima página de logs antigos
+        this.lastLogId = null;     // último id recebido (retomada do tail)
+        this.logStream = null;
+        this.stats = null;         // última visão completa de /api/stats
+        this.statsStream = null;
         this.init();
     }
     
     init() {
         this.createInterface();
         this.setupEventListeners();
-        this.startStatusPolling();
+        this.startStatusStream();
         console.log('🚀 Claudia Cobranças - Bot de Conversação iniciado!');
     }
     
@@ -152,6 +157,15 @@ class ClaudiaCobrancas {
                         <div class="logs-section">
                             <h2>📋 Logs do Sistema</h2>
                             <div class="logs-controls">
+                                <select id="logLevel" class="form-control" onchange="claudia.refreshLogs()">
+                                    <option value="">Todos os níveis</option>
+                                    <option value="debug">DEBUG+</option>
+                                    <option value="info">INFO+</option>
+                                    <option value="warning">WARNING+</option>
+                                    <option value="error">ERROR+</option>
+                                </select>
+                                <input type="text" id="logChat" class="form-control" placeholder="Filtrar por chat"
+                                       onchange="claudia.refreshLogs()">
                                 <button class="btn btn-secondary" onclick="claudia.refreshLogs()">
                                     <i class="fas fa-sync"></i> Atualizar
                                 </button>
@@ -160,6 +174,10 @@ class ClaudiaCobrancas {
                                 </button>
                             </div>
                             <div id="logsContainer" class="logs-content"></div>
+                            <button id="olderLogs" class="btn btn-secondary" style="display: none"
+                                    onclick="claudia.loadOlderLogs()">
+                                Carregar mais antigos
+                            </button>
                         </div>
                     </div>
                 </div>
@@ -187,28 +205,68 @@ class ClaudiaCobrancas {
         // Ativar tab selecionada
         document.querySelector(`[data-tab="${tabName}"]`).classList.add('active');
         document.getElementById(tabName).classList.add('active');
+        
+        // Tail de logs só enquanto a aba estiver aberta
+        if (tabName === 'logs') {
+            this.refreshLogs();
+        } else {
+            this.stopLogTail();
+        }
     }
     
-    startStatusPolling() {
-        // Atualizar status a cada 30 segundos
-        setInterval(() => {
+    startStatusStream() {
+        // Sem EventSource: volta ao polling de 30 segundos
+        if (!window.EventSource) {
+            setInterval(() => this.refreshStatus(), 30000);
             this.refreshStatus();
-        }, 30000);
+            return;
+        }
         
-        // Primeira atualização
-        this.refreshStatus();
+        // O servidor manda o snapshot completo ao conectar e depois só o que mudou;
+        // o EventSource reconecta sozinho (e recebe um snapshot novo)
+        this.statsStream = new EventSource('/api/stats/stream');
+        this.statsStream.addEventListener('snapshot', (event) => {
+            this.renderStatus(JSON.parse(event.data));
+        });
+        this.statsStream.addEventListener('delta', (event) => {
+            if (this.stats) {
+                this.renderStatus(this.mergeDelta(this.stats, JSON.parse(event.data)));
+            }
+        });
+        // Resposta de erro (ex.: 503 sob pressão de memória) encerra o EventSource de vez
+        this.statsStream.onerror = () => {
+            if (this.statsStream.readyState === EventSource.CLOSED) {
+                this.statsStream = null;
+                setTimeout(() => this.startStatusStream(), 10000);
+            }
+        };
+    }
+    
+    mergeDelta(target, delta) {
+        for (const [key, value] of Object.entries(delta)) {
+            if (value && typeof value === 'object' && !Array.isArray(value)
+                && target[key] && typeof target[key] === 'object' && !Array.isArray(target[key])) {
+                this.mergeDelta(target[key], value);
+            } else {
+                target[key] = value;
+            }
+        }
+        return target;
+    }
+    
+    renderStatus(data) {
+        this.stats = data;
+        if (data.success) {
+            this.updateStats(data.stats);
+            this.updateSystemStatus(data.bot_active);
+            this.updateWahaStatus(data.waha_url, data.waha_instance);
+        }
     }
     
     async refreshStatus() {
         try {
             const response = await fetch('/api/stats');
-            const data = await response.json();
-            
-            if (data.success) {
-                this.updateStats(data.stats);
-                this.updateSystemStatus(data.bot_active);
-                this.updateWahaStatus(data.waha_url, data.waha_instance);
-            }
+            this.renderStatus(await response.json());
         } catch (error) {
             console.error('Erro ao atualizar status:', error);
             this.addLog('Erro ao atualizar status: ' + error.message, 'error');
@@ -332,19 +390,98 @@ class ClaudiaCobrancas {
         }
     }
     
+    logQuery() {
+        const params = new URLSearchParams();
+        const level = document.getElementById('logLevel').value;
+        const chat = document.getElementById('logChat').value.trim();
+        if (level) params.set('level', level);
+        if (chat) params.set('chat', chat);
+        return params;
+    }
+    
     async refreshLogs() {
         try {
-            const response = await fetch('/api/logs');
+            const params = this.logQuery();
+            params.set('limit', '200');
+            const response = await fetch(`/api/logs?${params}`);
             const data = await response.json();
             
             if (data.success) {
                 this.displayLogs(data.logs);
+                this.logCursor = data.next_cursor;
+                this.lastLogId = data.latest_id;
+                document.getElementById('olderLogs').style.display = this.logCursor ? '' : 'none';
+                this.startLogTail();
             }
         } catch (error) {
             this.addLog('Erro ao carregar logs: ' + error.message, 'error');
         }
     }
     
+    async loadOlderLogs() {
+        if (!this.logCursor) return;
+        try {
+            const params = this.logQuery();
+            params.set('limit', '200');
+            params.set('cursor', this.logCursor);
+            const response = await fetch(`/api/logs?${params}`);
+            const data = await response.json();
+            
+            if (data.success) {
+                document.getElementById('logsContainer')
+                    .insertAdjacentHTML('beforeend', data.logs.map(log => this.renderLog(log)).join(''));
+                this.logCursor = data.next_cursor;
+                document.getElementById('olderLogs').style.display = this.logCursor ? '' : 'none';
+            }
+        } catch (error) {
+            this.addLog('Erro ao carregar logs antigos: ' + error.message, 'error');
+        }
+    }
+    
+    startLogTail() {
+        // Server-Sent Events: só as linhas novas, sem recarregar a lista
+        this.stopLogTail();
+        const params = this.logQuery();
+        if (this.lastLogId !== null) params.set('after', this.lastLogId);
+        this.logStream = new EventSource(`/api/logs/stream?${params}`);
+        this.logStream.onmessage = (event) => {
+            const log = JSON.parse(event.data);
+            this.lastLogId = log.id;
+            const container = document.getElementById('logsContainer');
+            const empty = container.querySelector('.text-muted');
+            if (empty) empty.remove();
+            container.insertAdjacentHTML('afterbegin', this.renderLog(log));
+            
+            // Limitar a quantidade de linhas no DOM
+            while (container.children.length > 500) {
+                container.lastElementChild.remove();
+            }
+        };
+    }
+    
+    stopLogTail() {
+        if (this.logStream) {
+            this.logStream.close();
+            this.logStream = null;
+        }
+    }
+    
+    escapeHtml(text) {
+        return String(text ?? '').replace(/[&<>"']/g, ch => ({
+            '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+        })[ch]);
+    }
+    
+    renderLog(log) {
+        return `
+            <div class="log-entry log-${this.escapeHtml(log.level.toLowerCase())}">
+                <span class="log-timestamp">${this.escapeHtml(log.timestamp)}</span>
+                <span class="log-level">${this.escapeHtml(log.level)}</span>
+                <span class="log-message">${this.escapeHtml(log.message)}</span>
+            </div>
+        `;
+    }
+    
     displayLogs(logs) {
         const container = document.getElementById('logsContainer');
         
@@ -353,19 +490,14 @@ class ClaudiaCobrancas {
             return;
         }
         
-        const logsHtml = logs.map(log => `
-            <div class="log-entry log-${log.level.toLowerCase()}">
-                <span class="log-timestamp">${log.timestamp}</span>
-                <span class="log-level">${log.level}</span>
-                <span class="log-message">${log.message}</span>
-            </div>
-        `).join('');
-        
-        container.innerHTML = logsHtml;
+        container.innerHTML = logs.map(log => this.renderLog(log)).join('');
     }
     
     clearLogs() {
+        // Limpa só a tela; o tail continua trazendo as linhas novas
         document.getElementById('logsContainer').innerHTML = '<p class="text-muted">Logs limpos</p>';
+        document.getElementById('olderLogs').style.display = 'none';
+        this.logCursor = null;
         this.addLog('Logs limpos pelo usuário', 'info');
     }
     